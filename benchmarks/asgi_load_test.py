@@ -0,0 +1,106 @@
+"""Compare the throughput of the read endpoints served by WSGI and by ASGI.
+
+Start both servers against the same database with one worker each, e.g.
+
+    gunicorn order_inventory_simple.wsgi --workers 1 --threads 32 --bind 127.0.0.1:8000
+    uvicorn order_inventory_simple.asgi:application --workers 1 --port 8001
+
+then run from the project root:
+
+    python benchmarks/asgi_load_test.py http://127.0.0.1:8000 http://127.0.0.1:8001
+
+Every connection requests the order list, an order, the inventory list and an
+inventory in turn for `--duration` seconds. `--slow-clients` of them read
+their responses slowly, like clients on a bad network. Only the standard
+library is used.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+
+def read_paths(base_url):
+    """The read routes, with an existing order id and inventory slug."""
+    def get(path):
+        with urllib.request.urlopen(base_url + path) as response:
+            return json.load(response)
+
+    orders = get('/api/orders')['orders']
+    inventories = get('/api/inventories')['inventories']
+    if not orders or not inventories:
+        raise SystemExit('Seed some orders and inventories first')
+    return ['/api/orders', '/api/orders/{0}'.format(orders[0]['id']),
+            '/api/inventories', '/api/inventories/{0}'.format(inventories[0]['slug'])]
+
+
+async def request(host, port, path, slow):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write('GET {0} HTTP/1.1\r\nHost: {1}\r\nConnection: close\r\n\r\n'.format(path, host).encode('ascii'))
+        await writer.drain()
+        status_line = await reader.readline()
+        while True:
+            chunk = await reader.read(1024 if slow else 65536)
+            if not chunk:
+                break
+            if slow:
+                await asyncio.sleep(0.01)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(host, port, paths, slow, deadline, results):
+    index = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status = await request(host, port, paths[index % len(paths)], slow)
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            status = None
+        results.append((status, time.perf_counter() - started))
+        index += 1
+
+
+async def load(base_url, connections, slow_clients, duration):
+    url = urlsplit(base_url)
+    paths = read_paths(base_url)
+    results = []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*[client(url.hostname, url.port or 80, paths, i < slow_clients, deadline, results)
+                           for i in range(connections)])
+    return results
+
+
+def report(name, results, duration):
+    latencies = sorted(elapsed * 1000 for status, elapsed in results if status == 200)
+    errors = sum(1 for status, _ in results if status != 200)
+    if not latencies:
+        print('{0:>5}: no successful request, {1} errors'.format(name, errors))
+        return
+    print('{0:>5}: {1:8.1f} req/s  p50 {2:8.1f} ms  p95 {3:8.1f} ms  {4} errors'.format(
+        name, len(latencies) / duration, statistics.median(latencies),
+        latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('wsgi_url')
+    parser.add_argument('asgi_url')
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--slow-clients', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=20)
+    options = parser.parse_args()
+
+    for name, base_url in (('wsgi', options.wsgi_url), ('asgi', options.asgi_url)):
+        results = asyncio.run(load(base_url.rstrip('/'), options.connections, options.slow_clients,
+                                   options.duration))
+        report(name, results, options.duration)
+
+
+if __name__ == '__main__':
+    main()
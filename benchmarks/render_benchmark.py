@@ -0,0 +1,51 @@
+"""Compare the old and the single pass OrderInventoryJSONRenderer.
+
+Run from the project root: `python benchmarks/render_benchmark.py [items]`.
+"""
+import os
+import sys
+import timeit
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_inventory_simple.settings')
+
+import django
+django.setup()
+
+import simplejson as json
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from order_inventory_simple.apps.orders.renderers import OrderJSONRenderer
+
+
+def old_render(data, label_plural='orders'):
+    # the renderer before it was rewritten: render, decode, load and dump again
+    _data = json.loads(JSONRenderer().render(data).decode('utf-8'))
+    return json.dumps({label_plural: _data})
+
+
+def make_orders(count):
+    return ReturnList([
+        {'id': i, 'email': 'customer{0}@test.com'.format(i), 'status': True,
+         'createdAt': '2020-01-29T07:59:00.000000+00:00', 'updatedAt': '2020-01-29T07:59:00.000000+00:00',
+         'ordered_items': [{'id': i * 3 + j, 'quantity': j + 1, 'product': j + 1, 'unit_price': '321.22'}
+                           for j in range(3)],
+         'total_price': Decimal('1927.32'), 'item_count': 3}
+        for i in range(count)], serializer=None)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    data = make_orders(count)
+    renderer = OrderJSONRenderer()
+
+    old = min(timeit.repeat(lambda: old_render(data), number=1, repeat=5))
+    new = min(timeit.repeat(lambda: renderer.render(data), number=1, repeat=5))
+    print('{0} orders: old {1:.1f} ms, new {2:.1f} ms, {3:.1f}x faster'.format(
+        count, old * 1000, new * 1000, old / new))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Compare the DRF serializers with the compiled readers of the read responses.
+
+Run from the project root: `python benchmarks/serializer_benchmark.py [orders]`.
+
+The orders, their items and products are built in memory, so only the
+serialization and the rendering are measured. The JSON of both paths is
+checked to be the same before timing.
+"""
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_inventory_simple.settings')
+
+import django
+django.setup()
+
+from order_inventory_simple.apps.core.fast import reader_for
+from order_inventory_simple.apps.inventories.models import Inventory
+from order_inventory_simple.apps.inventories.renderers import InventoryJSONRenderer
+from order_inventory_simple.apps.inventories.serializers import InventorySerializer
+from order_inventory_simple.apps.orders.models import Order, OrderedItem
+from order_inventory_simple.apps.orders.renderers import OrderJSONRenderer
+from order_inventory_simple.apps.orders.serializers import OrderDetailedSerializer, OrderSerializer
+
+ITEMS_PER_ORDER = 3
+
+
+def make_products(count):
+    created_at = datetime(2020, 1, 29, 7, 59, tzinfo=timezone.utc)
+    return [Inventory(id=i + 1, name='product{0}'.format(i), slug='product{0}'.format(i),
+                      description='A product description long enough to matter. ' * 4,
+                      price=Decimal('321.22'), quantity=300, reorder_threshold=10,
+                      created_at=created_at, updated_at=created_at)
+            for i in range(count)]
+
+
+def prefetched(model, rows):
+    # what prefetch_related leaves on an instance: a queryset holding its results
+    queryset = model.objects.all()
+    queryset._result_cache = rows
+    queryset._prefetch_done = True
+    return queryset
+
+
+def make_orders(count, products):
+    started = datetime(2020, 1, 29, 7, 59, tzinfo=timezone.utc)
+    orders = []
+    for i in range(count):
+        created_at = started + timedelta(seconds=i, microseconds=i)
+        order = Order(id=i + 1, email='customer{0}@test.com'.format(i), status=True,
+                      total_price=Decimal('1927.32'), item_count=ITEMS_PER_ORDER,
+                      created_at=created_at, updated_at=created_at)
+        items = []
+        for j in range(ITEMS_PER_ORDER):
+            product = products[(i + j) % len(products)]
+            item = OrderedItem(id=i * ITEMS_PER_ORDER + j + 1, order=order, quantity=j + 1,
+                               unit_price=product.price)
+            item.product = product
+            items.append(item)
+        order._prefetched_objects_cache = {'ordered_items': prefetched(OrderedItem, items)}
+        orders.append(order)
+    return orders
+
+
+def compare(name, serializer_class, renderer, instances):
+    reader = reader_for(serializer_class)
+
+    def drf():
+        return renderer.render(serializer_class(instances, many=True).data)
+
+    def fast():
+        return renderer.render(reader.many(instances))
+
+    if drf() != fast():
+        raise SystemExit('{0}: the readers and the serializers write different JSON'.format(name))
+    old = min(timeit.repeat(drf, number=1, repeat=5))
+    new = min(timeit.repeat(fast, number=1, repeat=5))
+    print('{0:>24}: serializer {1:8.1f} ms, reader {2:8.1f} ms, {3:.1f}x faster'.format(
+        name, old * 1000, new * 1000, old / new))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    products = make_products(500)
+    orders = make_orders(count, products)
+    print('{0} orders of {1} items, identical JSON checked'.format(count, ITEMS_PER_ORDER))
+
+    compare('OrderSerializer', OrderSerializer, OrderJSONRenderer(), orders)
+    compare('OrderDetailedSerializer', OrderDetailedSerializer, OrderJSONRenderer(), orders)
+    compare('InventorySerializer', InventorySerializer, InventoryJSONRenderer(),
+            make_products(count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Compare the old random slug suffix with the slug allocator.
+
+Run from the project root: `python benchmarks/slug_benchmark.py [count]`.
+No database is used: taken slugs are kept in a set, as the table would.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_inventory_simple.settings')
+
+import django
+django.setup()
+
+from django.utils.text import slugify
+
+from order_inventory_simple.apps.core.utils import generate_random_string
+from order_inventory_simple.apps.inventories.slugs import allocate_slugs
+
+BATCH_SIZE = 1000
+
+
+def old_slugs(names):
+    # the pre_save signal before the allocator: random.choice per char, no collision check
+    return [slugify(name) + '-' + generate_random_string() for name in names]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    # few distinct names, so suffixes have to tell the slugs apart
+    names = ['product {0}'.format(i % 100) for i in range(count)]
+
+    start = time.perf_counter()
+    slugs = old_slugs(names)
+    old_time = time.perf_counter() - start
+    collisions = count - len(set(slugs))
+
+    table = set()
+    lookups = [0]
+
+    def exists(candidates):
+        lookups[0] += 1
+        return table.intersection(candidates)
+
+    start = time.perf_counter()
+    for batch_start in range(0, count, BATCH_SIZE):
+        table.update(allocate_slugs(names[batch_start:batch_start + BATCH_SIZE], exists=exists))
+    new_time = time.perf_counter() - start
+
+    print('{0} slugs'.format(count))
+    print('old: {0:.2f} s, {1} collisions left to the unique constraint'.format(old_time, collisions))
+    print('new: {0:.2f} s, {1} unique, {2} lookups for {3} batches'.format(
+        new_time, len(table), lookups[0], -(-count // BATCH_SIZE)))
+
+
+if __name__ == '__main__':
+    main()
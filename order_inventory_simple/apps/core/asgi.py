@@ -0,0 +1,122 @@
+"""ASGI handler running the views in a bounded thread pool.
+
+The event loop reads requests and writes responses, so a single worker can
+hold many slow clients while only `ASGI_THREAD_POOL_SIZE` threads, and as
+many database connections, run views. Django 3.0 can not dispatch coroutine
+views, so the whole synchronous handler of a request is run in the pool.
+
+Streaming responses, like the exports, read the database while they are
+iterated: they are produced by one pool thread, handing the parts to the
+event loop through a bounded queue.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+
+#parts of a streaming response produced ahead of the client
+STREAM_BUFFER_SIZE = 8
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASGI_THREAD_POOL_SIZE', 32), thread_name_prefix='asgi-view')
+        return _executor
+
+
+async def run_in_pool(func, *args):
+    """`sync_to_async` on the bounded pool, keeping the context variables of the caller."""
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(executor(), context.run, func, *args)
+
+
+def _get_response(get_response, request):
+    # the pool threads keep their connections between requests, apply CONN_MAX_AGE like a WSGI worker
+    close_old_connections()
+    try:
+        return get_response(request)
+    finally:
+        close_old_connections()
+
+
+class PooledASGIHandler(ASGIHandler):
+
+    async def get_response(self, request):
+        return await run_in_pool(_get_response, super().get_response, request)
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers(response),
+        })
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER_SIZE)
+        disconnected = threading.Event()
+
+        def put(part):
+            asyncio.run_coroutine_threadsafe(queue.put(part), loop).result()
+
+        def produce():
+            # a server side cursor can not move between threads, iterate in a single one
+            try:
+                for part in response:
+                    if disconnected.is_set():
+                        break
+                    put(part)
+            finally:
+                put(None)
+                response.close()
+                close_old_connections()
+
+        producer = loop.run_in_executor(executor(), contextvars.copy_context().run, produce)
+        finished = False
+        try:
+            while True:
+                part = await queue.get()
+                if part is None:
+                    finished = True
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            if not finished:
+                # the client went away, stop the producer and take what it still puts
+                disconnected.set()
+                while await queue.get() is not None:
+                    pass
+            await producer
+
+
+def response_headers(response):
+    headers = []
+    for header, value in response.items():
+        if isinstance(header, str):
+            header = header.encode('ascii')
+        if isinstance(value, str):
+            value = value.encode('latin1')
+        headers.append((bytes(header), bytes(value)))
+    for cookie in response.cookies.values():
+        headers.append((b'Set-Cookie', cookie.output(header='').encode('ascii').strip()))
+    return headers
+
+
+def get_asgi_application():
+    import django
+    django.setup(set_prefix=False)
+    return PooledASGIHandler()
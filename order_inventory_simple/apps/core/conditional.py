@@ -0,0 +1,48 @@
+"""ETags and conditional requests for VersionedModel instances.
+
+The ETag of an instance is made of its primary key and version, so it
+changes with every change of the row and is never reused by a new row.
+"""
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+from .exceptions import PreconditionFailed
+
+
+def etag(instance):
+    return '"{0}-{1}"'.format(instance.pk, instance.version)
+
+
+def set_etag(response, instance):
+    response['ETag'] = etag(instance)
+    return response
+
+
+def not_modified(request, instance):
+    """A 304 response if If-None-Match names the current version of `instance`, else None."""
+    header = request.headers.get('If-None-Match', None)
+    if header is None:
+        return None
+    # weak comparison, W/"1-2" matches "1-2"
+    tags = [tag[2:] if tag.startswith('W/') else tag for tag in parse_etags(header)]
+    if '*' not in tags and etag(instance) not in tags:
+        return None
+    return set_etag(HttpResponseNotModified(), instance)
+
+
+def expected_version(request, instance):
+    """The version an If-Match request may change, None when any version may be changed.
+
+    Raises PreconditionFailed when If-Match does not name the version of
+    `instance` as it was read. The caller sets the result as the
+    `expected_version` of the instance, so the save checks it again.
+    """
+    header = request.headers.get('If-Match', None)
+    if header is None:
+        return None
+    tags = parse_etags(header)
+    if '*' in tags:
+        return None
+    if etag(instance) not in tags:
+        raise PreconditionFailed()
+    return instance.version
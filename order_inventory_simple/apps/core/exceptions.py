@@ -1,8 +1,21 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.views import exception_handler
 
 
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource was changed since this version, get it again before changing it.'
+    default_code = 'precondition_failed'
+
+
 def core_exception_handler(exc, context):
 
+    if isinstance(exc, DjangoValidationError):
+        # raised by the models, e.g. when stock can not be reserved
+        exc = ValidationError(detail=exc.messages)
+
     handlers = {
         'NotFound': _handle_not_found_error,
         'ValidationError': _handle_generic_error}
@@ -40,6 +53,6 @@ def _handle_not_found_error(exc, context, response):
             }
         }
     else:
-        response = _handle_generic_error(exc, contex, response)
+        response = _handle_generic_error(exc, context, response)
 
     return response
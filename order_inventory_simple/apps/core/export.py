@@ -0,0 +1,74 @@
+import simplejson as json
+from datetime import datetime, time, timedelta
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_TYPES = ('ndjson', 'json')
+
+
+def filter_created_at(queryset, created_after=None, created_before=None, field='created_at'):
+    """Limit `queryset` to rows created in [created_after, created_before).
+
+    Both bounds are ISO dates or datetimes, a ValueError is raised for
+    anything else. `field` is the datetime field compared to them. Dates and
+    naive datetimes are in the current timezone, a date names the whole day:
+    `created_before` a date ends at the end of that day.
+    """
+    if created_after:
+        queryset = queryset.filter(**{field + '__gte': _parse_bound(created_after)})
+    if created_before:
+        queryset = queryset.filter(**{field + '__lt': _parse_bound(created_before, end_of_day=True)})
+    return queryset
+
+
+def _parse_bound(value, end_of_day=False):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError("Invalid date: {0}".format(value))
+        parsed = datetime.combine(day + timedelta(days=1) if end_of_day else day, time.min)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def iter_serialized(queryset, serializer_class, chunk_size=EXPORT_CHUNK_SIZE, prefetch=()):
+    """Yield lists of serialized rows, holding only one chunk in memory.
+
+    Rows are read with a server side cursor; `prefetch` lookups are resolved
+    once per chunk since `.iterator()` ignores `prefetch_related`.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        if prefetch:
+            prefetch_related_objects(chunk, *prefetch)
+        # many=True builds the serializer fields once per chunk instead of once per row
+        yield serializer_class(chunk, many=True).data
+
+
+def stream_export(queryset, serializer_class, export_type='ndjson', label_plural='objects',
+                  chunk_size=EXPORT_CHUNK_SIZE, prefetch=()):
+    """Encode `queryset` chunk by chunk as NDJSON or as a JSON envelope."""
+    chunks = iter_serialized(queryset, serializer_class, chunk_size, prefetch)
+
+    if export_type == 'ndjson':
+        for chunk in chunks:
+            yield ''.join(json.dumps(row, use_decimal=True) + '\n' for row in chunk)
+        return
+
+    yield '{' + json.dumps(label_plural) + ':['
+    separator = ''
+    for chunk in chunks:
+        yield separator + ','.join(json.dumps(row, use_decimal=True) for row in chunk)
+        separator = ','
+    yield ']}'
+
+
+def export_content_type(export_type):
+    return 'application/x-ndjson' if export_type == 'ndjson' else 'application/json'
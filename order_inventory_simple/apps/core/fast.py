@@ -0,0 +1,193 @@
+"""Read-only fast path for the serializers of the list and detail responses.
+
+A reader is compiled once from a serializer class and a field selection:
+the DRF fields are built a single time and every field becomes a plain
+accessor, so a row costs one function call per field instead of the
+`get_attribute`/`to_representation` round trip of a Serializer. The output
+has the same keys, order and values as the serializer, the rendered JSON is
+byte for byte the same.
+
+Only model instances are read, with their nested relations prefetched. Only
+the fields reading a column of the model of their serializer are compiled,
+the others, e.g. a dotted source crossing a null relation, are read the way
+the serializer reads them.
+"""
+from decimal import Decimal
+from functools import lru_cache
+from operator import attrgetter, methodcaller
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+from . import metrics
+from .fields import IsoformatField
+from .sparse import select_fields
+
+#one reader per serializer class and field selection
+READER_CACHE_SIZE = 256
+
+#read for a field the serializer leaves out
+_SKIP = object()
+
+INTEGER_COLUMNS = ('AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField',
+                   'SmallIntegerField', 'PositiveIntegerField', 'PositiveSmallIntegerField')
+
+
+def _freeze(tree):
+    return tuple(sorted((name, _freeze(fields)) for name, fields in tree.items())) if tree else None
+
+
+def _thaw(frozen):
+    return {name: _thaw(fields) for name, fields in frozen} if frozen else None
+
+
+def reader_for(serializer_class, selected_fields=None):
+    """The reader of `serializer_class` returning the fields of `selected_fields`."""
+    return _reader_for(serializer_class, _freeze(selected_fields))
+
+
+@lru_cache(maxsize=READER_CACHE_SIZE)
+def _reader_for(serializer_class, frozen_fields):
+    return Reader(select_fields(serializer_class(), _thaw(frozen_fields)))
+
+
+def _decimal_representation(field):
+    to_representation = field.to_representation
+    if field.localize or field.decimal_places is None:
+        return to_representation
+    exponent = -field.decimal_places
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+
+    def represent(value):
+        # a column of the same decimal places is quantized already
+        if isinstance(value, Decimal) and value.as_tuple().exponent == exponent:
+            return '{:f}'.format(value) if coerce_to_string else value
+        return to_representation(value)
+    return represent
+
+
+def _representation(field):
+    """`field.to_representation`, or a builtin doing the same for the values of a model field."""
+    if isinstance(field, IsoformatField):
+        return methodcaller('isoformat')
+    if type(field) in (serializers.CharField, serializers.SlugField, serializers.EmailField):
+        return str
+    if type(field) is serializers.BooleanField:
+        return field.to_representation if field.allow_null else bool
+    if type(field) is serializers.DecimalField:
+        return _decimal_representation(field)
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.ReadOnlyField:
+        return None
+    return field.to_representation
+
+
+def _model_field(field):
+    """The column or relation of the model of its serializer `field` reads, None for any other source."""
+    model = getattr(getattr(field.parent, 'Meta', None), 'model', None)
+    if model is None or len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    return model_field if model_field.concrete or model_field.is_relation else None
+
+
+def _getter(field, model_field):
+    get = attrgetter(field.source)
+    to_representation = _representation(field)
+    if to_representation is int and model_field.get_internal_type() in INTEGER_COLUMNS:
+        # the value of an integer column is an int already
+        return get
+    if to_representation is None:
+        return get
+
+    def read(instance):
+        value = get(instance)
+        return None if value is None else to_representation(value)
+    return read
+
+
+def _serializer_getter(field):
+    # what Serializer.to_representation does for one field
+    def read(instance):
+        try:
+            value = field.get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        if (value.pk if isinstance(value, PKOnlyObject) else value) is None:
+            return None
+        return field.to_representation(value)
+    return read
+
+
+def _compile(field):
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(field.parent, field.method_name)
+    model_field = _model_field(field)
+    if model_field is None:
+        return _serializer_getter(field)
+    if isinstance(field, serializers.ListSerializer):
+        child = Reader(field.child)
+        get = attrgetter(field.source)
+        return lambda instance: [child.read(item) for item in get(instance).all()]
+    if isinstance(field, serializers.BaseSerializer):
+        child = Reader(field)
+        get = attrgetter(field.source)
+
+        def read_nested(instance):
+            try:
+                value = get(instance)
+            except ObjectDoesNotExist:
+                # a missing reverse one to one relation
+                return None
+            return None if value is None else child.read(value)
+        return read_nested
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # the id column of the foreign key, the related row is never loaded
+        return attrgetter(field.source + '_id')
+    return _getter(field, model_field)
+
+
+class FastReadViewMixin:
+    """Serializes the list and detail responses of a view with the reader of its serializer class.
+
+    The fields selected with `?fields=` are read unless `selected_fields` is
+    given, `{}` selecting all of them.
+    """
+
+    def fast_data(self, instance, many=False, serializer_class=None, selected_fields=None):
+        if selected_fields is None and hasattr(self, 'field_selection'):
+            selected_fields = self.field_selection()
+        reader = reader_for(serializer_class or self.get_serializer_class(), selected_fields)
+        with metrics.timer('serializer_time'):
+            return reader.many(instance) if many else reader.one(instance)
+
+
+class Reader:
+    """Maps instances to the dicts `serializer` would return."""
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.fields = [(name, _compile(field)) for name, field in serializer.fields.items()
+                       if not field.write_only]
+        self.may_skip = any(_model_field(field) is None for field in serializer.fields.values()
+                            if not field.write_only and not isinstance(field, serializers.SerializerMethodField))
+
+    def read(self, instance):
+        if self.may_skip:
+            values = ((name, read(instance)) for name, read in self.fields)
+            return {name: value for name, value in values if value is not _SKIP}
+        return {name: read(instance) for name, read in self.fields}
+
+    def one(self, instance):
+        return ReturnDict(self.read(instance), serializer=self.serializer)
+
+    def many(self, instances):
+        return ReturnList([self.read(instance) for instance in instances], serializer=self.serializer)
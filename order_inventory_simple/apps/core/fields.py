@@ -0,0 +1,13 @@
+from rest_framework import serializers
+
+
+class IsoformatField(serializers.ReadOnlyField):
+    """A datetime written with `isoformat()`.
+
+    Unlike DateTimeField it keeps the `+00:00` offset and microseconds as
+    they are, and unlike a SerializerMethodField it reads its `source`
+    column directly.
+    """
+
+    def to_representation(self, value):
+        return value.isoformat()
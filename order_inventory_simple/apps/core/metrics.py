@@ -0,0 +1,204 @@
+"""Per-request SQL and timing metrics.
+
+`RequestMetricsMiddleware` starts a `RequestMetrics` for every request while
+`REQUEST_METRICS_ENABLED` is set, counts the queries and their time through a
+database execute wrapper and reports the phases as a `Server-Timing` header.
+`MetricsViewMixin` splits the time spent in the view from the database time:
+the rest is the view's own time, serializing, paginating and reading the
+caches together. The serializers are timed apart, by the views reading
+their data with `serialized` and by the compiled readers, and the renderer
+adds its own time. Every finished request is added to the process-wide
+histograms served in Prometheus text format on `/api/_metrics`.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.view_time = 0.0
+        self.view_db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+
+    @property
+    def app_time(self):
+        # everything the view did besides waiting for the database
+        return max(self.view_time - self.view_db_time, 0.0)
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        return ', '.join((
+            'db;dur={0:.2f};desc="{1} queries"'.format(self.db_time * 1000, self.queries),
+            'app;dur={0:.2f};desc="view besides queries"'.format(self.app_time * 1000),
+            'serializer;dur={0:.2f}'.format(self.serializer_time * 1000),
+            'render;dur={0:.2f}'.format(self.render_time * 1000),
+            'total;dur={0:.2f}'.format(total * 1000),
+        ))
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def timer(attribute):
+    """Add the time of the block to `attribute` of the current request metrics."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(metrics, attribute, getattr(metrics, attribute) + time.perf_counter() - started)
+
+
+def serialized(serializer):
+    """`serializer.data`, its time added to the serializer time of the current request."""
+    with timer('serializer_time'):
+        return serializer.data
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield '{0}_bucket{{{1},le="{2}"}} {3}'.format(name, labels, bound, cumulative)
+        yield '{0}_sum{{{1}}} {2}'.format(name, labels, self.sum)
+        yield '{0}_count{{{1}}} {2}'.format(name, labels, self.count)
+
+
+class MetricsRegistry:
+    """Histograms per metric, view and method of this process."""
+
+    METRICS = (
+        ('request_duration_seconds', SECONDS_BUCKETS, 'Total time of the request.'),
+        ('request_db_seconds', SECONDS_BUCKETS, 'Time spent in database queries.'),
+        ('request_queries', QUERIES_BUCKETS, 'Number of database queries.'),
+        ('request_app_seconds', SECONDS_BUCKETS, 'Time spent in the view besides queries.'),
+        ('request_serializer_seconds', SECONDS_BUCKETS, 'Time spent serializing the response data.'),
+        ('request_render_seconds', SECONDS_BUCKETS, 'Time spent rendering the response.'),
+    )
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def observe(self, view, method, metrics, total):
+        values = (total, metrics.db_time, metrics.queries, metrics.app_time, metrics.serializer_time,
+                  metrics.render_time)
+        with self.lock:
+            for (name, buckets, _), value in zip(self.METRICS, values):
+                key = (name, view, method)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(buckets)
+                self.histograms[key].observe(value)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, _, description in self.METRICS:
+                lines.append('# HELP {0} {1}'.format(name, description))
+                lines.append('# TYPE {0} histogram'.format(name))
+                for (key_name, view, method), histogram in sorted(self.histograms.items()):
+                    if key_name == name:
+                        lines.extend(histogram.lines(name, 'view="{0}",method="{1}"'.format(view, method)))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """Opt-in with `REQUEST_METRICS_ENABLED`, unused and free otherwise."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with _wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - metrics.started
+        response['Server-Timing'] = metrics.server_timing(total)
+        match = getattr(request, 'resolver_match', None)
+        registry.observe(match.view_name if match else 'unmatched', request.method, metrics, total)
+        return response
+
+
+@contextmanager
+def _wrap_connections(metrics):
+    wrappers = [connections[alias].execute_wrapper(metrics.execute_wrapper) for alias in connections]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        yield
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+
+
+class MetricsViewMixin:
+    """Measures the view apart from the rendering of its response."""
+
+    def dispatch(self, request, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        started = time.perf_counter()
+        db_time = metrics.db_time
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            metrics.view_time += time.perf_counter() - started
+            metrics.view_db_time += metrics.db_time - db_time
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 
 class TimeStampModel(models.Model):
 
@@ -9,4 +10,53 @@ class TimeStampModel(models.Model):
         abstract = True
 
         ordering = ['-created_at', '-updated_at']
-        
\ No newline at end of file
+        
+
+class VersionConflict(Exception):
+    """The row was changed after the version a conditional save expected."""
+
+
+class VersionedModel(models.Model):
+    """Counts the changes of a row in `version`.
+
+    Every save bumps the version, the queryset updates changing a row bump it
+    with `F('version') + 1`. A save bumps it the same way and reads the new
+    version back, so a version is never written from a stale copy. When
+    `expected_version` is set the next save is an `UPDATE ... WHERE version =
+    expected_version` and raises VersionConflict if another change came
+    first, no row is locked to find out.
+    """
+    version = models.PositiveIntegerField(default=1)
+
+    expected_version = None
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        version = self.version
+        conditional = self.expected_version is not None
+        self.version = self.expected_version + 1 if conditional else F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+        try:
+            super().save(*args, **kwargs)
+        except Exception:
+            self.version = version
+            raise
+        finally:
+            self.expected_version = None
+        if not conditional:
+            self.version = type(self)._base_manager.filter(pk=self.pk).values_list('version', flat=True).get()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if self.expected_version is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if not super()._do_update(base_qs.filter(version=self.expected_version), using, pk_val, values,
+                                  update_fields, True):
+            raise VersionConflict('{0} {1} is not at version {2}'.format(
+                self._meta.verbose_name, pk_val, self.expected_version))
+        return True
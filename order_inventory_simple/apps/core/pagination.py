@@ -0,0 +1,24 @@
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+
+class TimeStampCursorPagination(CursorPagination):
+    """Keyset pagination over `TimeStampModel` rows, newest first.
+
+    Every page is read with `WHERE created_at < cursor ... LIMIT n` on the
+    `(created_at, id)` index, so deep pages cost the same as the first one.
+    """
+    ordering = ('-created_at', 'id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_paginated_response(self, data):
+        # the renderer wraps `results` in the label_plural envelope
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
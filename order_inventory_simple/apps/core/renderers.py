@@ -1,26 +1,75 @@
-import simplejson as json #https://stackoverflow.com/questions/1960516/python-json-serialize-a-decimal-object
 from decimal import Decimal
+
+import simplejson as json #https://stackoverflow.com/questions/1960516/python-json-serialize-a-decimal-object
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.utils.serializer_helpers import ReturnList
 
+from . import metrics
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder_default = JSONEncoder().default
+
+
+def _dumps_simplejson(data):
+    return json.dumps(data, use_decimal=True, default=_encoder_default,
+                      separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def _orjson_default(obj):
+    if isinstance(obj, Decimal):
+        return orjson.Fragment(str(obj))
+    return _encoder_default(obj)
+
+
+def _dumps_orjson(data):
+    # datetimes go through the DRF encoder so both backends write them the same way
+    return orjson.dumps(data, default=_orjson_default,
+                        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+if orjson is not None and hasattr(orjson, 'Fragment'):
+    dumps = _dumps_orjson
+else:
+    dumps = _dumps_simplejson
+
+
 class OrderInventoryJSONRenderer(JSONRenderer):
+    """Wraps payloads in the `label`/`label_plural` envelope.
+
+    The envelope is built around the serializer output and encoded once,
+    Decimals are written exactly. orjson is used when it is installed.
+    """
     charset = 'utf-8'
     label = 'object'
-    label_plural: 'objects'
+    label_plural = 'objects'
+    #keys of the data moved next to the objects in the envelope
+    side_maps = ()
+
+    def render(self, data, media_type=None, renderer_context=None):
+        with metrics.timer('render_time'):
+            return self._render(data)
 
-    def render(self, data, media_type=None, renderer_contex=None):
-        if not data:
-            return None
+    def _render(self, data):
+        if data is None:
+            return b''
 
-        
-        if isinstance(data,ReturnList):
-            _data = json.loads(super(OrderInventoryJSONRenderer, self).render(data).decode('utf-8'))
+        if isinstance(data, ReturnList):
+            return dumps({self.label_plural: data})
 
-            return json.dumps({self.label_plural:_data})   
+        side_maps = {key: data[key] for key in self.side_maps if key in data}
+        if side_maps:
+            data = {key: value for key, value in data.items() if key not in side_maps}
 
-        errors = data.get('errors', None)
+        if isinstance(data.get('results', None), ReturnList):
+            return dumps({self.label_plural: data['results'],
+                          'next': data.get('next'), 'previous': data.get('previous'), **side_maps})
 
-        if errors is not None:
-            return super(OrderInventoryJSONRenderer, self).render(data)
+        if data.get('errors', None) is not None:
+            return dumps(data)
 
-        return json.dumps({self.label: data}, use_decimal=True)
+        return dumps({self.label: data, **side_maps})
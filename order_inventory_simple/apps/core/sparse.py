@@ -0,0 +1,141 @@
+"""Sparse fieldsets: `?fields=` selects the fields of a response.
+
+`fields` is a comma separated list of field names, nested fields are named
+with dots: `fields=id,total_price,ordered_items.quantity` keeps the id and
+the total of the orders and only the quantity of their items. A level that
+names no field keeps all of them. Unknown names are a validation error.
+
+The selected fields also decide the columns read, the views pass them to
+`.only()` so unneeded columns, like the description of the products, are
+never loaded.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def parse_fields(value):
+    """Turn `a,b.c,b.d` into `{'a': {}, 'b': {'c': {}, 'd': {}}}`, None for no selection."""
+    if not value:
+        return None
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in path.strip().split('.'):
+            if not name:
+                raise ValidationError("fields: empty field name in {0}".format(path))
+            node = node.setdefault(name, {})
+    return tree
+
+
+def parse_expand(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+def select_fields(serializer, tree):
+    """Keep only the fields of `tree` in `serializer`, a list serializer selects for its child."""
+    if tree:
+        getattr(serializer, 'child', serializer).selected_fields = tree
+    return serializer
+
+
+def selected_columns(serializer, prefix=''):
+    """The lookups of the model fields read by the fields left in `serializer`, for `.only()`."""
+    serializer = getattr(serializer, 'child', serializer)
+    opts = serializer.Meta.model._meta
+    columns = [prefix + opts.pk.name]
+    for name, field in serializer.fields.items():
+        nested = getattr(field, 'child', field)
+        if isinstance(nested, serializers.BaseSerializer):
+            model_field = _concrete_field(opts, field.source)
+            # forward relations are joined, reverse ones prefetched with their own columns
+            if model_field is not None and model_field.is_relation:
+                columns.append(prefix + field.source)
+                columns.extend(selected_columns(nested, prefix + field.source + '__'))
+            continue
+        if _concrete_field(opts, field.source) is not None:
+            columns.append(prefix + field.source)
+    return columns
+
+
+def _concrete_field(opts, name):
+    try:
+        field = opts.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.concrete else None
+
+
+class SparseFieldsMixin:
+    """Lets a serializer return only the fields selected by `select_fields`."""
+    selected_fields = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.selected_fields:
+            return fields
+
+        unknown = [name for name in self.selected_fields if name not in fields]
+        if unknown:
+            raise ValidationError({'fields': ["Unknown field: {0}".format(name) for name in unknown]})
+        for name in list(fields):
+            if name not in self.selected_fields:
+                del fields[name]
+                continue
+            nested = getattr(fields[name], 'child', fields[name])
+            if self.selected_fields[name]:
+                if not isinstance(nested, SparseFieldsMixin):
+                    raise ValidationError({'fields': ["{0} has no fields to select".format(name)]})
+                nested.selected_fields = self.selected_fields[name]
+        return fields
+
+
+class SparseFieldsViewMixin:
+    """Applies `?fields=` to the serializers of a view and to the columns it reads.
+
+    `always_columns` are read whatever the selection, e.g. the ordering of
+    the cursor pagination.
+    """
+    always_columns = ('id', 'created_at')
+    #names of the maps of related objects sent next to the objects, selected like their fields
+    side_maps = ()
+
+    def field_selection(self):
+        if not hasattr(self, '_field_selection'):
+            tree = parse_fields(self.request.query_params.get('fields', None)) or {}
+            self._side_map_selection = {name: tree.pop(name) for name in self.side_maps if name in tree}
+            self._field_selection = tree or None
+        return self._field_selection
+
+    def side_map_selection(self, name):
+        self.field_selection()
+        return self._side_map_selection.get(name, None)
+
+    def get_serializer(self, *args, **kwargs):
+        return select_fields(super().get_serializer(*args, **kwargs), self.field_selection())
+
+    def only_selected(self, queryset, serializer_class=None, tree=None, extra=None):
+        """`queryset` reading only the columns of the fields of `serializer_class` selected by `tree`.
+
+        `tree` is the selection of the request and `extra` the
+        `always_columns` by default, pass both for a nested serializer.
+        """
+        tree = self.field_selection() if tree is None else tree
+        if not tree:
+            return queryset
+        serializer = select_fields((serializer_class or self.get_serializer_class())(), tree)
+        extra = self.always_columns if extra is None else extra
+        return queryset.only(*dict.fromkeys(selected_columns(serializer) + list(extra)))
+
+
+class ExpandViewMixin:
+    """`?expand=` names the optional parts of a response, out of `expandable`."""
+    expandable = ()
+
+    def expansion(self):
+        if not hasattr(self, '_expansion'):
+            self._expansion = parse_expand(self.request.query_params.get('expand', None))
+            unknown = sorted(self._expansion.difference(self.expandable))
+            if unknown:
+                raise ValidationError({'expand': ["Can not expand: {0}".format(name) for name in unknown]})
+        return self._expansion
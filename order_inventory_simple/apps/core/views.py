@@ -0,0 +1,41 @@
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+
+from . import metrics
+from .export import EXPORT_TYPES, export_content_type, filter_created_at, stream_export
+
+
+class StreamingExportMixin:
+    """Adds `GET <list route>/export` streaming every row as NDJSON or JSON.
+
+    Query parameters: `type` (ndjson or json), `created_after` and
+    `created_before` (ISO dates or datetimes).
+    """
+    export_serializer_class = None
+    export_prefetch = ()
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        export_type = request.query_params.get('type', 'ndjson')
+        if export_type not in EXPORT_TYPES:
+            raise ValidationError("type must be one of: {0}".format(', '.join(EXPORT_TYPES)))
+
+        try:
+            queryset = filter_created_at(
+                self.queryset.order_by('-created_at', 'id'),
+                request.query_params.get('created_after', None),
+                request.query_params.get('created_before', None))
+        except ValueError as e:
+            raise ValidationError(str(e))
+
+        renderer = self.renderer_classes[0]
+        return StreamingHttpResponse(
+            stream_export(queryset, self.export_serializer_class, export_type,
+                          label_plural=renderer.label_plural, prefetch=self.export_prefetch),
+            content_type=export_content_type(export_type))
+
+
+def metrics_view(request):
+    """Request histograms of this process in Prometheus text format."""
+    return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,28 @@
+from django.db.models import BooleanField, Case, F, Q, Value, When
+
+from .models import Inventory, StockAlert
+
+_crossed = (Q(low_stock=False, quantity__lte=F('reorder_threshold'))
+            | Q(low_stock=True, quantity__gt=F('reorder_threshold')))
+
+
+def sync_low_stock(inventories):
+    """Flip the low stock flag of the `inventories` that crossed their reorder threshold.
+
+    `inventories` is a queryset, normally the products whose quantity just
+    changed. An alert is queued to the StockAlert outbox for every crossing,
+    in the caller's transaction. Costs one query when nothing crossed, the
+    row locks taken by the stock update keep concurrent callers from
+    reporting the same crossing twice.
+    """
+    crossed = list(inventories.filter(_crossed).values_list('pk', 'quantity', 'reorder_threshold'))
+    if not crossed:
+        return []
+
+    low = [pk for pk, quantity, reorder_threshold in crossed if quantity <= reorder_threshold]
+    Inventory.objects.filter(pk__in=[pk for pk, _, _ in crossed]).update(
+        low_stock=Case(When(pk__in=low, then=Value(True)), default=Value(False), output_field=BooleanField()))
+    return StockAlert.objects.bulk_create([
+        StockAlert(inventory_id=pk, quantity=quantity, reorder_threshold=reorder_threshold,
+                   kind=StockAlert.LOW_STOCK if quantity <= reorder_threshold else StockAlert.RESTOCKED)
+        for pk, quantity, reorder_threshold in crossed])
@@ -0,0 +1,99 @@
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import cache
+from .alerts import sync_low_stock
+from .models import Inventory
+from .slugs import allocate_slugs
+
+IMPORT_CHUNK_SIZE = 1000
+
+
+class InventoryImportSerializer(serializers.ModelSerializer):
+    """Validates one imported row without querying the database.
+
+    Uniqueness of `name` is not checked here, rows with an existing name
+    update that inventory.
+    """
+    description = serializers.CharField(required=False, allow_blank=True)
+
+    class Meta:
+        model = Inventory
+        fields = ('name', 'description', 'price', 'quantity', 'reorder_threshold', 'status')
+        extra_kwargs = {'name': {'validators': []}}
+
+
+def upsert_inventories(rows, chunk_size=IMPORT_CHUNK_SIZE):
+    """Create or update inventories keyed on `name`.
+
+    `rows` is any iterable of dicts and is consumed `chunk_size` rows at a
+    time. Each chunk costs one locking SELECT, one bulk INSERT and one bulk
+    UPDATE per set of fields the rows supply, plus the low stock update when
+    rows cross their reorder threshold.
+    Invalid rows are reported by their index and do not stop the import.
+    """
+    result = {'created': 0, 'updated': 0, 'invalid': []}
+    rows = enumerate(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return result
+        _upsert_chunk(chunk, result)
+
+
+def _upsert_chunk(chunk, result):
+    # one serializer validates the whole chunk, its fields are built only once
+    serializer = InventoryImportSerializer()
+    valid = {}
+    for index, row in chunk:
+        try:
+            data = serializer.run_validation(row)
+        except serializers.ValidationError as e:
+            result['invalid'].append({'row': index, 'errors': e.detail})
+            continue
+        if data['name'] in valid:
+            result['invalid'].append({'row': index, 'errors': {'name': ['Duplicate name in this batch']}})
+            continue
+        valid[data['name']] = data
+
+    now = timezone.now()
+    to_create = []
+    to_update = {}
+
+    with transaction.atomic():
+        # locked until the updates are written, the rows are written back from this read
+        existing = Inventory.objects.select_for_update().in_bulk(list(valid), field_name='name')
+        for name, data in valid.items():
+            inventory = existing.get(name, None)
+            if inventory is None:
+                to_create.append(Inventory(**data))
+                continue
+            for field, value in data.items():
+                setattr(inventory, field, value)
+            inventory.updated_at = now
+            inventory.version = F('version') + 1
+            # only the supplied fields are written, e.g. a row without quantity leaves the stock alone
+            to_update.setdefault(frozenset(data) - {'name'}, []).append(inventory)
+
+        # bulk_create sends no pre_save signal, allocate all new slugs at once
+        for inventory, slug in zip(to_create, allocate_slugs([inventory.name for inventory in to_create])):
+            inventory.slug = slug
+
+        Inventory.objects.bulk_create(to_create)
+        for fields, inventories in to_update.items():
+            Inventory.objects.bulk_update(inventories, sorted(fields | {'updated_at', 'version'}))
+        updated = [inventory for inventories in to_update.values() for inventory in inventories]
+        crossed = [inventory.name for inventory in to_create + updated
+                   if inventory.low_stock != (inventory.quantity <= inventory.reorder_threshold)]
+        if crossed:
+            sync_low_stock(Inventory.objects.filter(name__in=crossed))
+
+    # bulk writes send no signals
+    updated_ids = [inventory.pk for inventory in updated]
+    transaction.on_commit(lambda: cache.invalidate(*updated_ids))
+    result['created'] += len(to_create)
+    result['updated'] += len(updated)
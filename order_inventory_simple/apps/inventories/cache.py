@@ -0,0 +1,179 @@
+"""Read-through cache for inventory lookups by id and slug.
+
+Entries are stored under versioned keys: invalidating an inventory bumps its
+version instead of deleting the entry, so a reader that loaded the row before
+the change can not put it back under the current key.
+
+Settings:
+
+* `INVENTORY_CACHE_ALIAS`: the Django cache to use, `default` by default.
+* `INVENTORY_CACHE_TIMEOUT`: seconds an entry is kept, 300 by default.
+* `INVENTORY_CACHE_FRESH_FIELDS`: fields that are always read from the
+  database, even on a hit. `('quantity',)` by default; set it to `()` to let
+  every field be served from the cache. The reserved quantity and the
+  version are read with the quantity.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Inventory
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300)
+
+
+def fresh_fields():
+    fields = tuple(getattr(settings, 'INVENTORY_CACHE_FRESH_FIELDS', ('quantity',)))
+    # stock updates change these without invalidating, they have to be as fresh as the quantity
+    if 'quantity' in fields:
+        fields += tuple(field for field in ('reserved_quantity', 'version') if field not in fields)
+    return fields
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def stats():
+    """Return the hit and miss counters of this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def _version_key(inventory_id):
+    return 'inventory:{0}:version'.format(inventory_id)
+
+
+def _object_key(inventory_id, version):
+    return 'inventory:{0}:v{1}'.format(inventory_id, version)
+
+
+def _slug_key(slug):
+    return 'inventory:slug:{0}'.format(slug)
+
+
+def _refresh(inventory):
+    fields = fresh_fields()
+    if not fields:
+        return inventory
+    values = Inventory.objects.filter(pk=inventory.pk).values(*fields).first()
+    if values is None:
+        return None
+    for field, value in values.items():
+        setattr(inventory, field, value)
+    return inventory
+
+
+def get_by_id(inventory_id):
+    """Return the inventory with this id, raising Inventory.DoesNotExist."""
+    cache = _cache()
+    version = cache.get(_version_key(inventory_id), 0)
+    inventory = cache.get(_object_key(inventory_id, version))
+
+    if inventory is not None:
+        inventory = _refresh(inventory)
+        if inventory is not None:
+            _count('hits')
+            return inventory
+
+    _count('misses')
+    inventory = Inventory.objects.get(pk=inventory_id)
+    cache.set(_object_key(inventory_id, version), inventory, _timeout())
+    cache.set(_slug_key(inventory.slug), inventory.pk, _timeout())
+    return inventory
+
+
+def get_by_slug(slug):
+    """Return the inventory with this slug, raising Inventory.DoesNotExist."""
+    inventory_id = _cache().get(_slug_key(slug))
+    if inventory_id is not None:
+        try:
+            inventory = get_by_id(inventory_id)
+        except Inventory.DoesNotExist:
+            inventory = None
+        if inventory is not None and inventory.slug == slug:
+            return inventory
+
+    _count('misses')
+    inventory = Inventory.objects.get(slug=slug)
+    cache = _cache()
+    version = cache.get(_version_key(inventory.pk), 0)
+    cache.set(_object_key(inventory.pk, version), inventory, _timeout())
+    cache.set(_slug_key(slug), inventory.pk, _timeout())
+    return inventory
+
+
+def get_many_by_id(inventory_ids):
+    """Return `{id: inventory}` for the ids that exist.
+
+    Cached entries are read with one `get_many`, their fresh fields with one
+    query for all of them and the misses with one `in_bulk`.
+    """
+    cache = _cache()
+    inventory_ids = list(dict.fromkeys(inventory_ids))
+    versions = cache.get_many([_version_key(inventory_id) for inventory_id in inventory_ids])
+    keys = {_object_key(inventory_id, versions.get(_version_key(inventory_id), 0)): inventory_id
+            for inventory_id in inventory_ids}
+    found = {keys[key]: inventory for key, inventory in cache.get_many(list(keys)).items()}
+
+    fields = fresh_fields()
+    if found and fields:
+        rows = {row.pop('pk'): row for row in Inventory.objects.filter(pk__in=list(found)).values('pk', *fields)}
+        for inventory_id in list(found):
+            if inventory_id not in rows:
+                del found[inventory_id]
+                continue
+            for field, value in rows[inventory_id].items():
+                setattr(found[inventory_id], field, value)
+
+    missing = [inventory_id for inventory_id in inventory_ids if inventory_id not in found]
+    with _stats_lock:
+        _stats['hits'] += len(found)
+        _stats['misses'] += len(missing)
+    if missing:
+        loaded = Inventory.objects.in_bulk(missing)
+        entries = {}
+        for key, inventory_id in keys.items():
+            if inventory_id in loaded:
+                entries[key] = loaded[inventory_id]
+                entries[_slug_key(loaded[inventory_id].slug)] = inventory_id
+        cache.set_many(entries, _timeout())
+        found.update(loaded)
+    return found
+
+
+def invalidate(*inventory_ids):
+    cache = _cache()
+    for inventory_id in inventory_ids:
+        key = _version_key(inventory_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # no version yet, anything cached was stored under version 0
+            cache.set(key, 1, None)
+
+
+def invalidate_stock(*inventory_ids):
+    """Called after stock changed with an UPDATE that sends no signals.
+
+    Nothing to do while the quantity is always read fresh.
+    """
+    if 'quantity' in fresh_fields():
+        return
+    invalidate(*inventory_ids)
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from ...models import StockAlert
+
+
+class Command(BaseCommand):
+    help = ('Write the pending stock alerts as JSON lines and mark them dispatched. '
+            'Concurrent runs skip the alerts another run is sending.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        dispatched = 0
+        while True:
+            with transaction.atomic():
+                alerts = list(StockAlert.objects.filter(dispatched_at=None)
+                              .select_related('inventory').select_for_update(skip_locked=True, of=('self',))
+                              .order_by('id')[:options['batch_size']])
+                if not alerts:
+                    break
+                for alert in alerts:
+                    self.stdout.write(json.dumps({
+                        'id': alert.pk,
+                        'kind': alert.kind,
+                        'inventory': alert.inventory.slug,
+                        'quantity': alert.quantity,
+                        'reorder_threshold': alert.reorder_threshold,
+                        'created_at': alert.created_at.isoformat(),
+                    }))
+                StockAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(dispatched_at=timezone.now())
+            dispatched += len(alerts)
+        self.stderr.write('Dispatched {0} stock alerts'.format(dispatched))
@@ -0,0 +1,50 @@
+import csv
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...bulk import IMPORT_CHUNK_SIZE, upsert_inventories
+
+MAXIMUM_REPORTED_ERRORS = 50
+
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield {key: value for key, value in row.items() if value != ''}
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl, 'ndjson': read_jsonl}
+
+
+class Command(BaseCommand):
+    help = 'Create or update inventories from a csv or jsonl file, keyed on name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(READERS),
+                            help='File format, guessed from the extension by default.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in READERS:
+            raise CommandError('Unknown file format: {0}'.format(file_format))
+        if not os.path.exists(path):
+            raise CommandError('File not found: {0}'.format(path))
+
+        result = upsert_inventories(READERS[file_format](path), chunk_size=options['chunk_size'])
+
+        for invalid in result['invalid'][:MAXIMUM_REPORTED_ERRORS]:
+            self.stderr.write('row {0}: {1}'.format(invalid['row'], json.dumps(invalid['errors'])))
+        self.stdout.write('Created {0}, updated {1}, invalid {2}'.format(
+            result['created'], result['updated'], len(result['invalid'])))
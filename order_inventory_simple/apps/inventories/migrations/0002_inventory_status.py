@@ -0,0 +1,18 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='status',
+            field=models.BooleanField(default=True),
+        ),
+    ]
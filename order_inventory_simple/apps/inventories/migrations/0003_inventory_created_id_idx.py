@@ -0,0 +1,17 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventories', '0002_inventory_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['-created_at', 'id'], name='inventory_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventories', '0003_inventory_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='inventory',
+            constraint=models.CheckConstraint(check=models.Q(quantity__gte=0), name='inventory_quantity_non_negative'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def flag_low_stock(apps, schema_editor):
+    Inventory = apps.get_model('inventories', 'Inventory')
+    Inventory.objects.filter(quantity__lte=models.F('reorder_threshold')).update(low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventories', '0004_inventory_quantity_non_negative'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low_stock', 'Low stock'), ('restocked', 'Restocked')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('reorder_threshold', models.IntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('dispatched_at', models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='low_stock',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='reorder_threshold',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(flag_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(condition=models.Q(low_stock=True), fields=['-created_at', 'id'], name='inventory_low_stock_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockalert',
+            name='inventory',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to='inventories.Inventory'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(condition=models.Q(dispatched_at=None), fields=['id'], name='stockalert_pending_idx'),
+        ),
+    ]
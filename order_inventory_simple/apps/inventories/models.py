@@ -1,8 +1,8 @@
 from django.db import models
-from ..core.models import TimeStampModel
+from ..core.models import TimeStampModel, VersionedModel
 
 
-class Inventory(TimeStampModel):
+class Inventory(VersionedModel, TimeStampModel):
     status = models.BooleanField(default=True)
     slug = models.SlugField(max_length=255, unique=True,
                             default='', db_index=True)
@@ -10,7 +10,27 @@ class Inventory(TimeStampModel):
     price = models.DecimalField(max_digits=5, decimal_places=2)
     description = models.TextField()
     quantity = models.PositiveIntegerField(default=1, blank=False)
+    #held by reservations, see stock.reserve_stock
+    reserved_quantity = models.PositiveIntegerField(default=0)
+    #low on stock once the quantity is at or below the threshold
+    reorder_threshold = models.PositiveIntegerField(default=0)
+    #kept in sync with the threshold by alerts.sync_low_stock, so low stock products are found by an index
+    low_stock = models.BooleanField(default=False)
+
+    class Meta(TimeStampModel.Meta):
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='inventory_created_id_idx'),
+            models.Index(fields=['-created_at', 'id'], name='inventory_low_stock_idx',
+                         condition=models.Q(low_stock=True)),
+        ]
+        constraints = [
+            models.CheckConstraint(check=models.Q(quantity__gte=0), name='inventory_quantity_non_negative'),
+        ]
     
+    @property
+    def available_quantity(self):
+        return self.quantity - self.reserved_quantity
+
     @property
     def ordered_quantity(self):
         return sum([item.quantity for item in self.ordered_items.all()])
@@ -21,3 +41,29 @@ class Inventory(TimeStampModel):
     
     # def to_representation(self, value):
     #     return value
+
+
+class StockAlert(models.Model):
+    """Outbox of reorder threshold crossings, drained by `dispatch_stock_alerts`."""
+    LOW_STOCK = 'low_stock'
+    RESTOCKED = 'restocked'
+    KINDS = (
+        (LOW_STOCK, 'Low stock'),
+        (RESTOCKED, 'Restocked'),
+    )
+
+    inventory = models.ForeignKey(
+        'Inventory', related_name='stock_alerts', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KINDS)
+    quantity = models.IntegerField()
+    reorder_threshold = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], name='stockalert_pending_idx', condition=models.Q(dispatched_at=None)),
+        ]
+
+    def __str__(self):
+        return '{0} {1}'.format(self.kind, self.inventory_id)
@@ -1,28 +1,42 @@
 from rest_framework import serializers
 
+from ..core.fields import IsoformatField
+from ..core.sparse import SparseFieldsMixin
 from .models import Inventory
 
+#changed by queryset updates of orders and reservations, never written back from a serializer
+STOCK_FIELDS = ('quantity', 'reserved_quantity', 'low_stock')
 
-class InventorySerializer(serializers.ModelSerializer):
+
+class InventorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     description = serializers.CharField(required=False)
 
     slug = serializers.SlugField(required=False)
-    createdAt = serializers.SerializerMethodField(method_name='get_created_at')
-    updatedAt = serializers.SerializerMethodField(method_name='get_updated_at')
+    createdAt = IsoformatField(source='created_at')
+    updatedAt = IsoformatField(source='updated_at')
 
     class Meta:
 
         model = Inventory
         fields = ('name', 'description', 'price',
-                  'createdAt', 'updatedAt', 'slug', 'quantity')
+                  'createdAt', 'updatedAt', 'slug', 'quantity', 'reorder_threshold', 'reserved_quantity')
+        read_only_fields = ('reserved_quantity',)
 
     def create(self, validated_data):
         return Inventory.objects.create(**validated_data)
 
-    def get_created_at(self, instance):
+    def update(self, instance, validated_data):
+        """Write only the validated fields, so the stock held by the instance is not restored.
 
-        return instance.created_at.isoformat()
+        The stock columns that were not sent are read back after an
+        unconditional save, a conditional one fails if they changed.
+        """
+        conditional = instance.expected_version is not None
+        for (key, value) in validated_data.items():
+            setattr(instance, key, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if not conditional:
+            instance.refresh_from_db(fields=[field for field in STOCK_FIELDS if field not in validated_data])
+        return instance
 
-    def get_updated_at(self, instance):
 
-        return instance.updated_at.isoformat()
@@ -1,28 +1,36 @@
-from django.db.models.signals import pre_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
-from django.utils.text import slugify
 
-from ..core.utils import generate_random_string
-from .models import Inventory
+from . import cache
+from .alerts import sync_low_stock
+from .models import Inventory, StockAlert
+from .slugs import allocate_slug
 
 
 @receiver(pre_save, sender=Inventory)
 def add_slug_to_article_if_not_exists(sender, instance, *args, **kwargs):
-    MAXIMUM_SLUG_LENGTH = 255
-
     if instance and not instance.slug:
-        slug = slugify(instance.name)
-        unique = generate_random_string()
-
-        if len(slug) > MAXIMUM_SLUG_LENGTH:
-            slug = slug[:MAXIMUM_SLUG_LENGTH]
-
-        while len(slug + '-' + unique) > MAXIMUM_SLUG_LENGTH:
-            parts = slug.split('-')
-
-            if len(parts) == 1:
-                slug = slug[:MAXIMUM_SLUG_LENGTH - len(unique) - 1]
-            else:
-                slug = '-'.join(parts[:-1])
-
-        instance.slug = slug + '-' + unique
+        instance.slug = allocate_slug(instance.name)
+
+
+@receiver(post_save, sender=Inventory)
+@receiver(post_delete, sender=Inventory)
+def invalidate_cached_inventory(sender, instance, *args, **kwargs):
+    # a reader of the committed row before the commit must not cache it under the new version
+    pk = instance.pk
+    transaction.on_commit(lambda: cache.invalidate(pk))
+
+
+@receiver(post_save, sender=Inventory)
+def check_low_stock(sender, instance, update_fields=None, *args, **kwargs):
+    if update_fields is not None:
+        # the columns that were not written may be stale on the instance, the row is checked
+        if not update_fields & {'quantity', 'reorder_threshold'}:
+            return
+    elif instance.low_stock == (instance.quantity <= instance.reorder_threshold):
+        # the saved row holds the values of the instance, only a crossing needs a query
+        return
+    for alert in sync_low_stock(Inventory.objects.filter(pk=instance.pk)):
+        # the flag was flipped by an UPDATE, a later save of this instance must not undo it
+        instance.low_stock = alert.kind == StockAlert.LOW_STOCK
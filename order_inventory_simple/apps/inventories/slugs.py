@@ -0,0 +1,74 @@
+import base64
+import secrets
+
+from django.utils.text import slugify
+
+from .models import Inventory
+
+MAXIMUM_SLUG_LENGTH = 255
+#5 random bytes are 8 base32 chars, about 10^12 suffixes per base slug
+SUFFIX_BYTES = 5
+SUFFIX_LENGTH = 8
+#number of candidate slugs checked by one query
+LOOKUP_BATCH_SIZE = 500
+
+
+def generate_suffixes(count):
+    """Return `count` random lowercase base32 tokens from one `secrets` call."""
+    chars = base64.b32encode(secrets.token_bytes(SUFFIX_BYTES * count)).decode('ascii').lower()
+    return [chars[start:start + SUFFIX_LENGTH] for start in range(0, len(chars), SUFFIX_LENGTH)]
+
+
+def base_slug(name):
+    """Slugify `name`, dropping trailing words so a suffix still fits."""
+    slug = slugify(name)[:MAXIMUM_SLUG_LENGTH]
+
+    while len(slug) + 1 + SUFFIX_LENGTH > MAXIMUM_SLUG_LENGTH:
+        parts = slug.split('-')
+
+        if len(parts) == 1:
+            slug = slug[:MAXIMUM_SLUG_LENGTH - SUFFIX_LENGTH - 1]
+        else:
+            slug = '-'.join(parts[:-1])
+
+    return slug
+
+
+def existing_slugs(candidates):
+    taken = set()
+    for start in range(0, len(candidates), LOOKUP_BATCH_SIZE):
+        taken.update(Inventory.objects.filter(
+            slug__in=candidates[start:start + LOOKUP_BATCH_SIZE]).values_list('slug', flat=True))
+    return taken
+
+
+def allocate_slugs(names, exists=existing_slugs):
+    """Return one unique slug per name, as `<base slug>-<random suffix>`.
+
+    All candidates are checked against the table together, and against each
+    other, so a batch normally costs a single query; only the rare colliding
+    candidates are drawn again. `exists` receives a list of candidate slugs
+    and returns the ones already taken.
+    """
+    bases = [base_slug(name) for name in names]
+    slugs = [None] * len(bases)
+    allocated = set()
+    pending = list(range(len(bases)))
+
+    while pending:
+        candidates = [(index, bases[index] + '-' + suffix)
+                      for index, suffix in zip(pending, generate_suffixes(len(pending)))]
+        taken = exists([slug for _, slug in candidates])
+        pending = []
+        for index, slug in candidates:
+            if slug in taken or slug in allocated:
+                pending.append(index)
+                continue
+            slugs[index] = slug
+            allocated.add(slug)
+
+    return slugs
+
+
+def allocate_slug(name):
+    return allocate_slugs([name])[0]
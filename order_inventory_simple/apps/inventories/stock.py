@@ -0,0 +1,116 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, When
+
+from . import cache
+from .alerts import sync_low_stock
+from .models import Inventory
+
+#keep the number of sql parameters of one stock update well below backend limits
+STOCK_UPDATE_BATCH_SIZE = 200
+
+
+def collect_stock_deltas(items, sign=1):
+    """Sum the quantities of ordered items per product.
+
+    `items` may be model instances or dicts with `product`/`product_id` and
+    `quantity`. A positive delta takes stock, a negative one gives it back.
+    """
+    deltas = defaultdict(int)
+    for item in items:
+        if isinstance(item, dict):
+            product = item.get('product', None)
+            product_id = getattr(product, 'pk', product) if product is not None else item.get('product_id')
+            quantity = item.get('quantity', 0)
+        else:
+            product_id = item.product_id
+            quantity = item.quantity
+        deltas[product_id] += sign * quantity
+    return deltas
+
+
+def merge_stock_deltas(*deltas_list):
+    merged = defaultdict(int)
+    for deltas in deltas_list:
+        for product_id, delta in deltas.items():
+            merged[product_id] += delta
+    return merged
+
+
+def apply_stock_deltas(deltas, held=None):
+    """Apply per-product stock deltas atomically.
+
+    All products are changed by a single conditional UPDATE (one per
+    `STOCK_UPDATE_BATCH_SIZE` products). Stock is only taken when the product
+    is active and has enough quantity left that no reservation holds, so
+    concurrent checkouts can never oversell or lose an update. If any product
+    can not be changed the whole update is rolled back. Products crossing
+    their reorder threshold queue a stock alert.
+
+    `held` are the per-product quantities of a reservation turned into the
+    order: the same UPDATE releases them, and they are available to the deltas.
+    """
+    _update_stock(deltas, held or {}, 'quantity', -1)
+
+
+def reserve_stock(deltas):
+    """Hold (positive deltas) or release (negative deltas) stock for reservations.
+
+    `reserved_quantity` is changed the way apply_stock_deltas changes
+    `quantity`, only what is available can be held. The quantity available
+    to sell is `quantity - reserved_quantity`.
+    """
+    _update_stock(deltas, {}, 'reserved_quantity', 1)
+
+
+def _update_stock(deltas, held, field, sign):
+    product_ids = sorted(product_id for product_id in set(deltas).union(held)
+                         if deltas.get(product_id, 0) or held.get(product_id, 0))
+    #no savepoint of its own: a failure has to roll back the caller's transaction too
+    with transaction.atomic(savepoint=False):
+        for start in range(0, len(product_ids), STOCK_UPDATE_BATCH_SIZE):
+            batch = product_ids[start:start + STOCK_UPDATE_BATCH_SIZE]
+            condition = Q()
+            whens = []
+            released = []
+            for product_id in batch:
+                delta = deltas.get(product_id, 0)
+                hold = held.get(product_id, 0)
+                if delta > 0:
+                    condition |= Q(pk=product_id, status=True,
+                                   quantity__gte=F('reserved_quantity') + (delta - hold))
+                else:
+                    condition |= Q(pk=product_id)
+                whens.append(When(pk=product_id, then=F(field) + sign * delta))
+                if hold:
+                    released.append(When(pk=product_id, then=F('reserved_quantity') - hold))
+
+            values = {field: Case(*whens, output_field=IntegerField()), 'version': F('version') + 1}
+            if released:
+                values['reserved_quantity'] = Case(*released, default=F('reserved_quantity'),
+                                                   output_field=IntegerField())
+            updated = Inventory.objects.filter(condition).update(**values)
+            if updated != len(batch):
+                _raise_stock_error(batch, deltas, held)
+            if field == 'quantity':
+                sync_low_stock(Inventory.objects.filter(pk__in=batch))
+
+        transaction.on_commit(lambda: cache.invalidate_stock(*product_ids))
+
+
+def _raise_stock_error(product_ids, deltas, held):
+    products = Inventory.objects.only('name', 'status', 'quantity', 'reserved_quantity').in_bulk(product_ids)
+    for product_id in product_ids:
+        product = products.get(product_id, None)
+        if product is None:
+            raise ValidationError("Product with id {0} does not exist".format(product_id))
+        delta = deltas.get(product_id, 0)
+        if delta <= 0:
+            continue
+        if not product.status:
+            raise ValidationError("Can not order this product(name:{0}), the product status is not active".format(product.name))
+        if product.available_quantity + held.get(product_id, 0) < delta:
+            raise ValidationError("Out of stock, no enough this product: {0}".format(product.name))
+    raise ValidationError("Stock changed while updating, please try again")
@@ -1,10 +1,26 @@
 import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
 
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework.views import status
-from .models import Inventory
+from ..core.models import VersionConflict
+from . import bulk, cache
+from .models import Inventory, StockAlert
 from .serializers import InventorySerializer
+from .slugs import MAXIMUM_SLUG_LENGTH, allocate_slugs
+from .stock import apply_stock_deltas, reserve_stock
 
    
 class BaseViewTest(APITestCase):
@@ -30,14 +46,24 @@ class BaseViewTest(APITestCase):
 class GetAllInventory(BaseViewTest):
 
     def test_get_all_inventories(self):
-        expected  = Inventory.objects.all()
+        expected  = Inventory.objects.order_by('-created_at', 'id')
         response = self.client.get(reverse("inventories:inventories-list"))
 
        
         serialized = InventorySerializer(expected, many=True)
-        self.assertEqual(response.data, serialized.data)
+        self.assertEqual(response.data['results'], serialized.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_paginate_inventories(self):
+        response = self.client.get(reverse("inventories:inventories-list"), {'page_size': 1})
+        content = json.loads(response.content)
+        self.assertEqual([inventory['name'] for inventory in content['inventories']], ['test_product1'])
+
+        response = self.client.get(content['next'])
+        content = json.loads(response.content)
+        self.assertEqual([inventory['name'] for inventory in content['inventories']], ['test_product0'])
+        self.assertIsNone(content['next'])
+
 
 class GetSingleInventoryTest(APITestCase):
 
@@ -126,6 +152,40 @@ class UpdateSingleInventoryTest(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_update_keeps_concurrent_stock_changes(self):
+        stocked = Inventory.objects.create(
+            name='product102', description="good product", price=23.99, quantity=10, reorder_threshold=5)
+        url = reverse("inventories:inventories-detail", kwargs={'slug': stocked.slug})
+        is_valid = InventorySerializer.is_valid
+
+        def order_then_validate(serializer, *args, **kwargs):
+            #an order and a hold run after the view read the inventory
+            with transaction.atomic():
+                apply_stock_deltas({stocked.pk: 6})
+                reserve_stock({stocked.pk: 2})
+            return is_valid(serializer, *args, **kwargs)
+
+        with mock.patch.object(InventorySerializer, 'is_valid', order_then_validate):
+            response = self.client.patch(url, data=json.dumps({"description": "patched"}),
+                                         content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['quantity'], response.data['reserved_quantity']), (4, 2))
+        stocked = Inventory.objects.get(pk=stocked.pk)
+        self.assertEqual((stocked.description, stocked.quantity, stocked.reserved_quantity, stocked.low_stock),
+                         ("patched", 4, 2, True))
+
+        #the crossing is checked against the quantity of the row, not of a stale instance
+        stale = Inventory.objects.get(pk=stocked.pk)
+        with transaction.atomic():
+            apply_stock_deltas({stocked.pk: -6})
+        serializer = InventorySerializer(stale, data={"reorder_threshold": 12}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertEqual(Inventory.objects.get(pk=stocked.pk).quantity, 10)
+        self.assertTrue(Inventory.objects.get(pk=stocked.pk).low_stock)
+        self.assertEqual(list(StockAlert.objects.filter(inventory=stocked).order_by('id').values_list('kind', flat=True)),
+                         [StockAlert.LOW_STOCK, StockAlert.RESTOCKED, StockAlert.LOW_STOCK])
+
 
 class DeleteSingleInventoryTest(APITestCase):
     """ Test module for deleting an existing inventory record """
@@ -144,3 +204,392 @@ class DeleteSingleInventoryTest(APITestCase):
         response = self.client.delete(
             reverse("inventories:inventories-detail", kwargs={'slug': self.first.slug+"aaa"}))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class StockDeltasTest(TransactionTestCase):
+    """ Test module for applying stock deltas under concurrent checkouts """
+
+    def setUp(self):
+        self.product = Inventory.objects.create(
+            name='product200', description="contended product", price=10, quantity=50)
+
+    def reserve(self, quantity, results):
+        try:
+            while True:
+                try:
+                    apply_stock_deltas({self.product.pk: quantity})
+                    results.append(True)
+                    return
+                except DjangoValidationError:
+                    results.append(False)
+                    return
+                except OperationalError:
+                    # sqlite reports "table is locked" instead of waiting, retry
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_reservations_do_not_oversell(self):
+        results = []
+        threads = [threading.Thread(target=self.reserve, args=(3, results)) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        #50 // 3 reservations fit, every other one is rejected and nothing is lost
+        self.assertEqual(results.count(True), 16)
+        self.assertEqual(results.count(False), 4)
+        self.assertEqual(Inventory.objects.get(pk=self.product.pk).quantity, 2)
+
+    def test_out_of_stock_changes_nothing(self):
+        other = Inventory.objects.create(
+            name='product201', description="other product", price=10, quantity=5)
+
+        with self.assertRaises(DjangoValidationError):
+            apply_stock_deltas({other.pk: 1, self.product.pk: 51})
+
+        self.assertEqual(Inventory.objects.get(pk=other.pk).quantity, 5)
+        self.assertEqual(Inventory.objects.get(pk=self.product.pk).quantity, 50)
+
+    def test_inactive_product_can_not_be_taken(self):
+        Inventory.objects.filter(pk=self.product.pk).update(status=False)
+
+        with self.assertRaises(DjangoValidationError):
+            apply_stock_deltas({self.product.pk: 1})
+
+        apply_stock_deltas({self.product.pk: -1})
+        self.assertEqual(Inventory.objects.get(pk=self.product.pk).quantity, 51)
+
+
+class SparseInventoryTest(BaseViewTest):
+    """ Test module for selecting the fields of the inventory responses """
+
+    def test_list_reads_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("inventories:inventories-list"), {'fields': 'name,price'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'name', 'price'})
+        self.assertNotIn('"description"', queries[0]['sql'])
+
+    def test_retrieve_selected_fields(self):
+        inventory = Inventory.objects.get(name='test_product1')
+        response = self.client.get(reverse("inventories:inventories-detail", kwargs={"slug": inventory.slug}),
+                                   {'fields': 'slug,quantity'})
+
+        self.assertEqual(dict(response.data), {'slug': inventory.slug, 'quantity': inventory.quantity})
+
+
+class ExportInventoryTest(BaseViewTest):
+
+    def test_export_inventories(self):
+        response = self.client.get(reverse("inventories:inventories-export"), {'type': 'json'})
+
+        content = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([inventory['name'] for inventory in content['inventories']],
+                         ['test_product1', 'test_product0'])
+
+
+class InventoryCacheTest(APITestCase):
+    """ Test module for the inventory read-through cache """
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.reset_stats()
+        self.first = Inventory.objects.create(
+            name='product300', description="cached product", price=10, quantity=30)
+
+    def retrieve(self):
+        return self.client.get(reverse("inventories:inventories-detail", kwargs={'slug': self.first.slug}))
+
+    def test_retrieve_is_cached(self):
+        self.retrieve()
+        #only the fresh quantity is read on a hit
+        with self.assertNumQueries(1):
+            response = self.retrieve()
+        self.assertEqual(response.data.get('name'), 'product300')
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+
+    @override_settings(INVENTORY_CACHE_FRESH_FIELDS=())
+    def test_retrieve_without_fresh_fields(self):
+        self.retrieve()
+        with self.assertNumQueries(0):
+            self.retrieve()
+
+    def test_quantity_is_always_fresh(self):
+        self.retrieve()
+        apply_stock_deltas({self.first.pk: 5})
+
+        self.assertEqual(self.retrieve().data.get('quantity'), 25)
+
+
+
+class InventoryCacheInvalidationTest(TransactionTestCase):
+    """ Test module for invalidating the inventory cache once changes are committed """
+
+    def setUp(self):
+        caches['default'].clear()
+        cache.reset_stats()
+        self.first = Inventory.objects.create(
+            name='product300', description="cached product", price=10, quantity=30)
+
+    def retrieve(self):
+        return self.client.get(reverse("inventories:inventories-detail", kwargs={'slug': self.first.slug}))
+
+    def test_save_invalidates(self):
+        self.retrieve()
+        self.client.put(
+            reverse("inventories:inventories-detail", kwargs={'slug': self.first.slug}),
+            data=json.dumps({"description": "changed"}), content_type='application/json')
+
+        self.assertEqual(self.retrieve().data.get('description'), 'changed')
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 2})
+
+    def test_delete_invalidates(self):
+        self.retrieve()
+        self.first.delete()
+
+        self.assertEqual(self.retrieve().status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalidated_on_commit(self):
+        self.retrieve()
+        with transaction.atomic():
+            Inventory.objects.get(pk=self.first.pk).save()
+            #other readers still see the committed row, it stays cached under the current version
+            self.assertEqual(cache.get_by_id(self.first.pk).description, 'cached product')
+            self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+
+        cache.get_by_id(self.first.pk)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 2})
+
+    def test_rolled_back_save_keeps_the_entry(self):
+        self.retrieve()
+        with transaction.atomic():
+            Inventory.objects.get(pk=self.first.pk).save()
+            transaction.set_rollback(True)
+
+        cache.get_by_id(self.first.pk)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1})
+
+
+class ConditionalInventoryTest(APITestCase):
+    """ Test module for the ETags and conditional requests of inventories """
+
+    def setUp(self):
+        caches['default'].clear()
+        self.first = Inventory.objects.create(
+            name='product700', description="versioned product", price=10, quantity=30)
+        self.url = reverse("inventories:inventories-detail", kwargs={'slug': self.first.slug})
+
+    def test_stock_change_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        #the cached inventory is served with a fresh version
+        apply_stock_deltas({self.first.pk: 5})
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('quantity'), 25)
+        self.assertEqual(response['ETag'], '"{0}-2"'.format(self.first.pk))
+
+    def test_update_is_conditional(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.patch(self.url, data=json.dumps({"description": "first"}),
+                                     content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+        response = self.client.patch(self.url, data=json.dumps({"description": "second"}),
+                                     content_type='application/json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).description, 'first')
+
+    def test_conditional_save_is_one_update(self):
+        stale = Inventory.objects.get(pk=self.first.pk)
+        Inventory.objects.get(pk=self.first.pk).save()
+
+        stale.description = 'stale'
+        stale.expected_version = stale.version
+        with self.assertRaises(VersionConflict), CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                stale.save()
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"version" = 1', updates[0])
+        self.assertEqual(stale.version, 1)
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).version, 2)
+
+
+class BulkInventoryTest(APITestCase):
+    """ Test module for the bulk inventory upsert """
+
+    def setUp(self):
+        self.first = Inventory.objects.create(
+            name='product400', description="old description", price=10, quantity=1)
+
+    def test_bulk_upsert(self):
+        rows = [{"name": "product400", "description": "new description", "quantity": 5, "price": 11},
+                {"name": "product401", "price": 12.5, "quantity": 3},
+                {"name": "product402", "price": "not a price"},
+                {"name": "product401", "price": 13}]
+        #savepoint, locking select, slug lookup, insert, update, release
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse("inventories:inventories-bulk"),
+                                        data=json.dumps(rows), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual([invalid['row'] for invalid in response.data['invalid']], [2, 3])
+
+        first = Inventory.objects.get(pk=self.first.pk)
+        self.assertEqual((first.description, first.quantity, first.slug), ("new description", 5, self.first.slug))
+        created = Inventory.objects.get(name="product401")
+        self.assertEqual(created.quantity, 3)
+        self.assertTrue(created.slug.startswith('product401-'))
+
+    def test_rows_only_write_the_fields_they_supply(self):
+        second = Inventory.objects.create(name='product401', description="other", price=10, quantity=20)
+        allocate = bulk.allocate_slugs
+
+        def order_during_the_import(names, *args, **kwargs):
+            # an order decrements the stock after the rows were read
+            apply_stock_deltas({self.first.pk: 1, second.pk: 5})
+            return allocate(names, *args, **kwargs)
+
+        rows = [{"name": "product400", "price": 11, "quantity": 9},
+                {"name": "product401", "price": 12}]
+        with mock.patch.object(bulk, 'allocate_slugs', order_during_the_import):
+            result = bulk.upsert_inventories(rows)
+
+        self.assertEqual(result['updated'], 2)
+        self.assertEqual(Inventory.objects.values_list('price', 'quantity').get(pk=self.first.pk), (11, 9))
+        self.assertEqual(Inventory.objects.values_list('price', 'quantity').get(pk=second.pk), (12, 15))
+
+    def test_bulk_requires_a_list(self):
+        response = self.client.post(reverse("inventories:inventories-bulk"),
+                                    data=json.dumps({"name": "product401"}), content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_inventory_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("name,description,price,quantity\n")
+            f.write("product400,imported,10,7\n")
+            for i in range(5):
+                f.write("imported{0},,1.5,2\n".format(i))
+        self.addCleanup(os.remove, f.name)
+
+        out = StringIO()
+        call_command('import_inventory', f.name, '--chunk-size', '2', stdout=out)
+        self.assertIn('Created 5, updated 1, invalid 0', out.getvalue())
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 7)
+
+
+class AllocateSlugsTest(APITestCase):
+    """ Test module for the slug allocator """
+
+    def test_taken_slugs_are_drawn_again(self):
+        checked = []
+
+        def exists(candidates):
+            checked.append(candidates)
+            #everything of the first round is taken
+            return set(candidates) if len(checked) == 1 else set()
+
+        slugs = allocate_slugs(['Product One', 'Product Two'], exists=exists)
+        self.assertEqual(len(checked), 2)
+        self.assertTrue(slugs[0].startswith('product-one-'))
+        self.assertTrue(slugs[1].startswith('product-two-'))
+        self.assertNotIn(slugs[0], checked[0])
+
+    def test_slugs_are_unique_within_a_batch(self):
+        slugs = allocate_slugs(['same name'] * 1000, exists=lambda candidates: set())
+        self.assertEqual(len(set(slugs)), 1000)
+
+    def test_long_names_fit_the_column(self):
+        slug = allocate_slugs(['word ' * 100], exists=lambda candidates: set())[0]
+        self.assertLessEqual(len(slug), MAXIMUM_SLUG_LENGTH)
+
+    def test_single_save_checks_the_table_once(self):
+        with self.assertNumQueries(2):
+            inventory = Inventory.objects.create(name='product500', description="slug", price=1)
+        self.assertTrue(inventory.slug.startswith('product500-'))
+
+
+class InventoryConstraintsTest(APITestCase):
+    """ Test module for the inventory constraints and indexes """
+
+    def setUp(self):
+        self.product = Inventory.objects.create(
+            name='product300', description="constrained product", price=10, quantity=5)
+
+    def test_quantity_can_not_be_negative(self):
+        with self.assertRaises(IntegrityError):
+            Inventory.objects.filter(pk=self.product.pk).update(quantity=-1)
+
+    @skipUnless(connection.vendor == 'sqlite', 'the query plan is read in the SQLite format')
+    def test_list_page_uses_created_id_index(self):
+        plan = Inventory.objects.order_by('-created_at', 'id')[:21].explain()
+        self.assertIn('USING INDEX inventory_created_id_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class LowStockTest(APITestCase):
+    """ Test module for the low stock alerts """
+
+    def setUp(self):
+        self.product = Inventory.objects.create(
+            name='product600', description="watched product", price=10, quantity=10, reorder_threshold=3)
+        self.other = Inventory.objects.create(
+            name='product601', description="plenty of stock", price=10, quantity=100, reorder_threshold=3)
+
+    def alerts(self):
+        return list(StockAlert.objects.order_by('id').values_list('inventory__name', 'kind', 'quantity'))
+
+    def test_crossing_the_threshold_queues_an_alert(self):
+        apply_stock_deltas({self.product.pk: 6, self.other.pk: 6})
+        self.assertEqual(self.alerts(), [])
+
+        apply_stock_deltas({self.product.pk: 1})
+        #still below the threshold, the crossing is reported once
+        apply_stock_deltas({self.product.pk: 1})
+        self.assertEqual(self.alerts(), [('product600', StockAlert.LOW_STOCK, 3)])
+        self.assertTrue(Inventory.objects.get(pk=self.product.pk).low_stock)
+
+        apply_stock_deltas({self.product.pk: -5})
+        self.assertEqual(self.alerts()[1:], [('product600', StockAlert.RESTOCKED, 7)])
+        self.assertFalse(Inventory.objects.get(pk=self.product.pk).low_stock)
+
+    def test_saving_a_threshold_queues_an_alert(self):
+        self.other.reorder_threshold = 100
+        self.other.save()
+
+        self.assertTrue(self.other.low_stock)
+        self.assertEqual(self.alerts(), [('product601', StockAlert.LOW_STOCK, 100)])
+
+    def test_low_stock_lists_only_low_products(self):
+        apply_stock_deltas({self.product.pk: 8})
+
+        response = self.client.get(reverse("inventories:inventories-low-stock"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.data['results']], ['product600'])
+
+    @skipUnless(connection.vendor == 'sqlite', 'the query plan is read in the SQLite format')
+    def test_low_stock_uses_partial_index(self):
+        plan = Inventory.objects.filter(low_stock=True).order_by('-created_at', 'id')[:21].explain()
+        self.assertIn('USING INDEX inventory_low_stock_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_dispatch_marks_alerts_sent(self):
+        apply_stock_deltas({self.product.pk: 8})
+        out = StringIO()
+
+        call_command('dispatch_stock_alerts', stdout=out, stderr=StringIO())
+        call_command('dispatch_stock_alerts', stdout=out, stderr=StringIO())
+
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([(line['inventory'], line['kind']) for line in lines],
+                         [(self.product.slug, StockAlert.LOW_STOCK)])
+        self.assertFalse(StockAlert.objects.filter(dispatched_at=None).exists())
@@ -1,20 +1,44 @@
+from django.http import Http404
 from django.shortcuts import render
 
 from rest_framework import serializers, status, generics, mixins, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
 
 
+from ..core import conditional, metrics
+from ..core.exceptions import PreconditionFailed
+from ..core.fast import FastReadViewMixin
+from ..core.metrics import MetricsViewMixin
+from ..core.models import VersionConflict
+from ..core.pagination import TimeStampCursorPagination
+from ..core.sparse import SparseFieldsViewMixin
+from ..core.views import StreamingExportMixin
+from . import cache
+from .bulk import upsert_inventories
 from .models import Inventory
 from .serializers import InventorySerializer
 from .renderers import InventoryJSONRenderer
 
 
-class InventoryViewSet(mixins.CreateModelMixin,mixins.ListModelMixin,   mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+class InventoryViewSet(MetricsViewMixin, SparseFieldsViewMixin, FastReadViewMixin, StreamingExportMixin, mixins.CreateModelMixin,mixins.ListModelMixin,   mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
     lookup_field = 'slug'
     queryset = Inventory.objects.all()
+    pagination_class = TimeStampCursorPagination
     renderer_classes = (InventoryJSONRenderer,)
     serializer_class = InventorySerializer
+    export_serializer_class = InventorySerializer
+
+    def get_queryset(self):
+        # only the columns of the fields selected with ?fields= are read
+        if self.action in ('list', 'low_stock'):
+            return self.only_selected(self.queryset)
+        return self.queryset
+
+    def list(self, request):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        return self.get_paginated_response(self.fast_data(page, many=True))
 
     def create(self, request):
         serializer_data = request.data
@@ -27,7 +51,37 @@ class InventoryViewSet(mixins.CreateModelMixin,mixins.ListModelMixin,   mixins.R
         serializer.is_valid(raise_exception=True)
         serializer.save()
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        response = Response(metrics.serialized(serializer), status=status.HTTP_201_CREATED)
+        return conditional.set_etag(response, serializer.instance)
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('inventories', None)
+        if not isinstance(rows, list):
+            raise serializers.ValidationError('Expected a list of inventories')
+
+        return Response(upsert_inventories(rows), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], url_path='low-stock', url_name='low-stock')
+    def low_stock(self, request):
+        """Products at or below their reorder threshold, read through a partial index."""
+        queryset = self.get_queryset().filter(low_stock=True)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self.fast_data(page, many=True))
+
+    def retrieve(self, request, slug):
+        try:
+            serializer_instance = cache.get_by_slug(slug)
+        except Inventory.DoesNotExist:
+            raise Http404
+
+        response = conditional.not_modified(request, serializer_instance)
+        if response is not None:
+            return response
+        return conditional.set_etag(Response(self.fast_data(serializer_instance), status=status.HTTP_200_OK),
+                                    serializer_instance)
 
     def update(self, request, slug):
         try:
@@ -35,12 +89,21 @@ class InventoryViewSet(mixins.CreateModelMixin,mixins.ListModelMixin,   mixins.R
         except Inventory.DoesNotExist:
             raise NotFound("Inventory with this slug not found")
 
+        expected_version = conditional.expected_version(request, serializer_instance)
         serializer = self.serializer_class(
             serializer_instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer_instance.expected_version = expected_version
+        try:
+            serializer.save()
+        except VersionConflict:
+            raise PreconditionFailed()
+
+        response = Response(metrics.serialized(serializer), status=status.HTTP_200_OK)
+        return conditional.set_etag(response, serializer_instance)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def partial_update(self, request, slug):
+        return self.update(request, slug)
 
     def destroy(self, request, slug):
         try:
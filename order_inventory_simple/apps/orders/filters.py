@@ -0,0 +1,22 @@
+from ..core.export import filter_created_at
+
+STATUS_VALUES = {'true': True, '1': True, 'false': False, '0': False}
+
+
+def filter_orders(queryset, params):
+    """Apply the `email`, `status`, `created_after` and `created_before` query parameters.
+
+    The email is matched exactly, so the (email, created_at) index is used.
+    A ValueError is raised for an invalid status or date.
+    """
+    email = params.get('email', None)
+    if email:
+        queryset = queryset.filter(email=email)
+
+    order_status = params.get('status', None)
+    if order_status:
+        if order_status.lower() not in STATUS_VALUES:
+            raise ValueError("status must be true or false")
+        queryset = queryset.filter(status=STATUS_VALUES[order_status.lower()])
+
+    return filter_created_at(queryset, params.get('created_after', None), params.get('created_before', None))
@@ -0,0 +1,125 @@
+"""Replay protection for order submissions with an `Idempotency-Key` header.
+
+The first request with a key claims it by inserting an `IdempotencyKey` row in
+the same transaction that creates the order and stores its response, so a
+stored row always holds a response. A concurrent duplicate blocks on the
+unique key until that transaction ends and then replays the stored response;
+if the first request failed, nothing was stored and the duplicate runs
+instead. Replays skip validation, inserts and stock updates, and return the
+body, the status and the `STORED_HEADERS` of the first response.
+
+Settings:
+
+* `IDEMPOTENCY_KEY_TTL`: seconds a key is kept, 86400 by default. Expired keys
+  can be used again and are deleted by the `purge_idempotency_keys` command.
+* `IDEMPOTENCY_CACHE_ALIAS`: the Django cache holding completed responses in
+  front of the table, `default` by default; `None` to always use the table.
+"""
+import hashlib
+from datetime import timedelta
+
+import simplejson as json
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAXIMUM_KEY_LENGTH = 255
+#headers of the first response sent again with its replays
+STORED_HEADERS = ('ETag',)
+
+
+class IdempotencyKeyReused(exceptions.APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used with a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400)
+
+
+def expired_before():
+    return timezone.now() - timedelta(seconds=ttl())
+
+
+def _cache():
+    alias = getattr(settings, 'IDEMPOTENCY_CACHE_ALIAS', 'default')
+    return caches[alias] if alias else None
+
+
+def _cache_key(key):
+    return 'idempotency:{0}'.format(hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+
+def fingerprint(data):
+    """Hash of the request body, to reject a key reused for another request."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=JSONEncoder().default).encode('utf-8')).hexdigest()
+
+
+def run_once(key, data, view):
+    """Return the response of `view()` for the first request with `key`, replay it afterwards."""
+    if len(key) > MAXIMUM_KEY_LENGTH:
+        raise exceptions.ValidationError(
+            {HEADER: ['Ensure this value has at most {0} characters.'.format(MAXIMUM_KEY_LENGTH)]})
+    request_hash = fingerprint(data)
+
+    cache = _cache()
+    if cache is not None:
+        cached = cache.get(_cache_key(key))
+        if cached is not None:
+            return _replay(request_hash, *cached)
+
+    # retries usually come after the first request finished, its row has the response
+    record = IdempotencyKey.objects.filter(key=key, created_at__gte=expired_before()).first()
+    if record is not None:
+        return _replay(request_hash, *_stored(record))
+
+    with transaction.atomic():
+        record = _claim(key, request_hash)
+        if record is None:
+            return _replay(request_hash, *_stored(IdempotencyKey.objects.get(key=key)))
+
+        response = view()
+        record.status_code = response.status_code
+        record.response_body = json.dumps(response.data, default=JSONEncoder().default)
+        record.response_headers = json.dumps(
+            {name: response[name] for name in STORED_HEADERS if response.has_header(name)})
+        record.save(update_fields=['status_code', 'response_body', 'response_headers'])
+
+    if cache is not None:
+        cache.set(_cache_key(key), _stored(record), ttl())
+    return response
+
+
+def _stored(record):
+    return record.request_hash, record.status_code, record.response_body, record.response_headers
+
+
+def _claim(key, request_hash):
+    """Insert the key, or return None when another request holds it."""
+    try:
+        # a savepoint, so the surrounding transaction is still usable after a duplicate
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(key=key, request_hash=request_hash)
+    except IntegrityError:
+        pass
+    # an expired key is free again even if it was not purged yet
+    if IdempotencyKey.objects.filter(key=key, created_at__lt=expired_before()).delete()[0]:
+        return IdempotencyKey.objects.create(key=key, request_hash=request_hash)
+    return None
+
+
+def _replay(request_hash, stored_hash, status_code, response_body, response_headers=''):
+    if request_hash != stored_hash:
+        raise IdempotencyKeyReused()
+    headers = json.loads(response_headers) if response_headers else {}
+    headers[REPLAYED_HEADER] = 'true'
+    return Response(json.loads(response_body, use_decimal=True), status=status_code, headers=headers)
@@ -0,0 +1,336 @@
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from ....inventories.models import Inventory
+from ....inventories.slugs import allocate_slugs
+from ...models import Order, OrderedItem, Reservation
+
+SEED_BATCH_SIZE = 5000
+
+
+class BenchState:
+    """Ids of the seeded rows the routes pick their targets from."""
+
+    def __init__(self, inventory_ids, inventory_slugs, order_ids, deletable_slugs):
+        self.inventory_ids = inventory_ids
+        self.inventory_slugs = inventory_slugs
+        self.order_ids = order_ids
+        self.deletable_slugs = deletable_slugs
+        self.created = 0
+
+    def random_order_id(self):
+        return random.choice(self.order_ids)
+
+    def order_items(self, count=3):
+        return [{'product': product_id, 'quantity': 1}
+                for product_id in random.sample(self.inventory_ids, count)]
+
+    def new_name(self):
+        self.created += 1
+        return 'bench-new-{0}'.format(self.created)
+
+    def random_email(self):
+        return 'customer{0}@bench.com'.format(random.randrange(min(len(self.order_ids), 1000)))
+
+    def hold(self, **reservation_data):
+        products = Inventory.objects.in_bulk(random.sample(self.inventory_ids, 3))
+        return Reservation.hold([{'product': product, 'quantity': 1} for product in products.values()],
+                                 ttl=600, **reservation_data)
+
+
+def _get(url):
+    return lambda client: client.get(url)
+
+
+def _delete(url):
+    return lambda client: client.delete(url)
+
+
+def _json(method, url, data):
+    return lambda client: getattr(client, method)(url, data=json.dumps(data), content_type='application/json')
+
+
+def _export(url):
+    def request(client):
+        response = client.get(url)
+        b''.join(response.streaming_content)
+        return response
+    return request
+
+
+# each route picks its target and returns the request to time, so the setup is not measured
+
+def inventories_list(state):
+    return _get(reverse('inventories:inventories-list'))
+
+
+def inventories_detail(state):
+    return _get(reverse('inventories:inventories-detail', kwargs={'slug': random.choice(state.inventory_slugs)}))
+
+
+def inventories_create(state):
+    return _json('post', reverse('inventories:inventories-list'),
+                 {'name': state.new_name(), 'description': 'bench', 'price': 1, 'quantity': 10})
+
+
+def inventories_update(state):
+    return _json('put', reverse('inventories:inventories-detail', kwargs={'slug': random.choice(state.inventory_slugs)}),
+                 {'description': 'updated'})
+
+
+def inventories_delete(state):
+    return _delete(reverse('inventories:inventories-detail', kwargs={'slug': state.deletable_slugs.pop()}))
+
+
+def inventories_bulk(state):
+    return _json('post', reverse('inventories:inventories-bulk'),
+                 [{'name': state.new_name(), 'price': 1, 'quantity': 10} for _ in range(100)])
+
+
+def inventories_low_stock(state):
+    return _get(reverse('inventories:inventories-low-stock'))
+
+
+def inventories_export(state):
+    return _export(reverse('inventories:inventories-export'))
+
+
+def orders_list(state):
+    return _get(reverse('orders:order-list'))
+
+
+def orders_detail(state):
+    return _get(reverse('orders:order-detail', kwargs={'pk': state.random_order_id()}))
+
+
+def orders_create(state):
+    return _json('post', reverse('orders:order-list'),
+                 {'email': 'bench@test.com', 'ordered_items': state.order_items()})
+
+
+def orders_update(state):
+    return _json('put', reverse('orders:order-detail', kwargs={'pk': state.random_order_id()}),
+                 {'ordered_items': state.order_items()})
+
+
+def orders_delete(state):
+    return _delete(reverse('orders:order-detail', kwargs={'pk': state.order_ids.pop()}))
+
+
+def orders_export(state):
+    return _export(reverse('orders:order-export'))
+
+
+def order_item_add(state):
+    order_id = state.random_order_id()
+    existing = set(OrderedItem.objects.filter(order_id=order_id).values_list('product_id', flat=True))
+    product_id = random.choice(state.inventory_ids)
+    while product_id in existing:
+        product_id = random.choice(state.inventory_ids)
+    return _json('post', reverse('orders:order_item', kwargs={'order_id': order_id}),
+                 {'product': product_id, 'quantity': 1})
+
+
+def order_item_remove(state):
+    order_id = state.random_order_id()
+    item_id = OrderedItem.objects.filter(order_id=order_id).values_list('id', flat=True).first()
+    return _json('delete', reverse('orders:order_item', kwargs={'order_id': order_id}), {'item_id': item_id})
+
+
+def order_item_patch(state):
+    order_id = state.random_order_id()
+    item_id = OrderedItem.objects.filter(order_id=order_id).values_list('id', flat=True).first()
+    return _json('patch', reverse('orders:order_item', kwargs={'order_id': order_id}),
+                 {'item_id': item_id, 'quantity': random.randint(1, 3)})
+
+
+def customer_summary(state):
+    return _get(reverse('orders:customer_summary', kwargs={'email': state.random_email()}))
+
+
+def reservations_create(state):
+    return _json('post', reverse('orders:reservation-list'),
+                 {'email': 'bench@test.com', 'items': state.order_items()})
+
+
+def reservations_detail(state):
+    return _get(reverse('orders:reservation-detail', kwargs={'pk': state.hold().pk}))
+
+
+def reservations_release(state):
+    return _delete(reverse('orders:reservation-detail', kwargs={'pk': state.hold().pk}))
+
+
+def reservations_confirm(state):
+    return lambda client: client.post(
+        reverse('orders:reservation-confirm', kwargs={'pk': state.hold(email='bench@test.com').pk}))
+
+
+def reports_top_products(state):
+    return _get(reverse('reports:top_products'))
+
+
+def reports_sales(state):
+    return _get(reverse('reports:sales'))
+
+
+def metrics(state):
+    return _get(reverse('metrics'))
+
+
+ROUTES = {
+    'inventories-list': inventories_list,
+    'inventories-detail': inventories_detail,
+    'inventories-create': inventories_create,
+    'inventories-update': inventories_update,
+    'inventories-delete': inventories_delete,
+    'inventories-bulk': inventories_bulk,
+    'inventories-export': inventories_export,
+    'inventories-low-stock': inventories_low_stock,
+    'orders-list': orders_list,
+    'orders-detail': orders_detail,
+    'orders-create': orders_create,
+    'orders-update': orders_update,
+    'orders-delete': orders_delete,
+    'orders-export': orders_export,
+    'order-item-add': order_item_add,
+    'order-item-remove': order_item_remove,
+    'order-item-patch': order_item_patch,
+    'customer-summary': customer_summary,
+    'reservations-create': reservations_create,
+    'reservations-detail': reservations_detail,
+    'reservations-release': reservations_release,
+    'reservations-confirm': reservations_confirm,
+    'reports-top-products': reports_top_products,
+    'reports-sales': reports_sales,
+    'metrics': metrics,
+}
+
+#exports read every row, run them fewer times
+SLOW_ROUTES = ('inventories-export', 'orders-export')
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and report latency, queries and peak memory '
+            'per API route as JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inventories', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument('--items-per-order', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=20, help='Requests per route.')
+        parser.add_argument('--routes', nargs='*', choices=sorted(ROUTES), help='Only run these routes.')
+        parser.add_argument('--output', help='File to write the JSON report to, stdout by default.')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+
+    def handle(self, *args, **options):
+        if options['items_per_order'] > options['inventories']:
+            raise CommandError('--items-per-order can not exceed --inventories')
+        random.seed(options['seed'])
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            seed_started = time.perf_counter()
+            state = self.seed(options['inventories'], options['orders'], options['items_per_order'],
+                              options['requests'])
+            report = {
+                'volumes': {
+                    'inventories': options['inventories'],
+                    'orders': options['orders'],
+                    'ordered_items': options['orders'] * options['items_per_order'],
+                },
+                'seed_seconds': round(time.perf_counter() - seed_started, 3),
+                'routes': {},
+            }
+            client = Client()
+            for name in options['routes'] or sorted(ROUTES):
+                requests = 1 if name in SLOW_ROUTES else options['requests']
+                report['routes'][name] = self.run_route(client, state, ROUTES[name], requests)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def seed(self, inventory_count, order_count, items_per_order, requests):
+        names = ['bench-product-{0}'.format(i) for i in range(inventory_count)]
+        slugs = allocate_slugs(names, exists=lambda candidates: set())
+        Inventory.objects.bulk_create(
+            [Inventory(name=name, slug=slug, description='bench product', price=Decimal('9.99'),
+                       quantity=10 ** 9) for name, slug in zip(names, slugs)])
+        inventory_ids = list(Inventory.objects.order_by('id').values_list('id', flat=True))
+
+        Order.objects.bulk_create(
+            [Order(email='customer{0}@bench.com'.format(i % 1000), total_price=Decimal('9.99') * items_per_order,
+                   item_count=items_per_order) for i in range(order_count)])
+        order_ids = list(Order.objects.order_by('id').values_list('id', flat=True))
+
+        items = []
+        for order_id in order_ids:
+            for product_id in random.sample(inventory_ids, items_per_order):
+                items.append(OrderedItem(order_id=order_id, product_id=product_id,
+                                         quantity=1, unit_price=Decimal('9.99')))
+            if len(items) >= SEED_BATCH_SIZE:
+                OrderedItem.objects.bulk_create(items)
+                items = []
+        OrderedItem.objects.bulk_create(items)
+
+        deletable = [Inventory.objects.create(name='bench-deletable-{0}'.format(i), description='bench', price=1)
+                     for i in range(requests + 1)]
+
+        random.shuffle(order_ids)
+        return BenchState(inventory_ids, slugs, order_ids, [inventory.slug for inventory in deletable])
+
+    def run_route(self, client, state, route, requests):
+        latencies = []
+        queries = []
+        statuses = set()
+        for _ in range(requests):
+            request = route(state)
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = request(client)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context.captured_queries))
+            statuses.add(response.status_code)
+
+        # tracing slows every allocation down, measure memory on one more request only
+        request = route(state)
+        tracemalloc.start()
+        try:
+            request(client)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'requests': requests,
+            'status_codes': sorted(statuses),
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'queries_per_request': round(statistics.mean(queries), 2),
+            'max_queries': max(queries),
+            'peak_memory_bytes': peak_memory,
+        }
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Order
+from ...renderers import OrderJSONRenderer
+from ...serializers import OrderSerializer
+from ....core.export import EXPORT_CHUNK_SIZE, EXPORT_TYPES, filter_created_at, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream every order as NDJSON or JSON without loading them all in memory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=EXPORT_TYPES, default='ndjson')
+        parser.add_argument('--created-after', help='ISO date or datetime, inclusive.')
+        parser.add_argument('--created-before', help='ISO date or datetime, exclusive.')
+        parser.add_argument('--output', help='File to write to, stdout by default.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            orders = filter_created_at(
+                Order.objects.order_by('-created_at', 'id'),
+                options['created_after'], options['created_before'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        chunks = stream_export(orders, OrderSerializer, options['type'],
+                               label_plural=OrderJSONRenderer.label_plural,
+                               chunk_size=options['chunk_size'], prefetch=('ordered_items',))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
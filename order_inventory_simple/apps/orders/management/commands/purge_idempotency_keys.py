@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ... import idempotency
+from ...models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete the idempotency keys older than IDEMPOTENCY_KEY_TTL.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int,
+                            help='Age in seconds of the keys to delete, IDEMPOTENCY_KEY_TTL by default.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['older_than'] is None:
+            cutoff = idempotency.expired_before()
+        else:
+            cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+
+        # small batches keep each delete short, requests claiming keys are not blocked for long
+        expired = IdempotencyKey.objects.filter(created_at__lt=cutoff)
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        self.stdout.write('Deleted {0} idempotency keys'.format(deleted))
@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+from ...models import Order
+
+
+def with_computed_totals(orders):
+    line_price = ExpressionWrapper(
+        F('ordered_items__quantity') * F('ordered_items__unit_price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2))
+    return orders.annotate(
+        computed_price=Sum(line_price), computed_count=Count('ordered_items')
+    ).only('id', 'total_price', 'item_count').order_by('id')
+
+
+def set_computed_totals(order):
+    """Set the computed totals on `order`, returns whether the stored ones were wrong."""
+    computed_price = (order.computed_price or Decimal(0)).quantize(Decimal('0.01'))
+    if order.total_price == computed_price and order.item_count == order.computed_count:
+        return False
+    order.total_price = computed_price
+    order.item_count = order.computed_count
+    return True
+
+
+def repair(order_ids):
+    """Recompute the totals of `order_ids` under the locks of the orders, returns how many were fixed.
+
+    An item change of one of these orders waits for the lock, and a fixed
+    order gets a new version so the ETags of its wrong totals stop matching.
+    """
+    with transaction.atomic():
+        # locked apart, FOR UPDATE can not be combined with the GROUP BY of the totals
+        list(Order.objects.select_for_update().filter(pk__in=order_ids).order_by('id').values_list('pk'))
+        wrong = [order for order in with_computed_totals(Order.objects.filter(pk__in=order_ids))
+                 if set_computed_totals(order)]
+        for order in wrong:
+            order.version = F('version') + 1
+        if wrong:
+            Order.objects.bulk_update(wrong, ['total_price', 'item_count', 'version'])
+    return len(wrong)
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored total price and item count of every order from its items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report orders whose stored totals are wrong.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        orders = with_computed_totals(Order.objects.all())
+
+        checked = fixed = 0
+        wrong = []
+        # the scan only finds the candidates, they are checked again under their locks
+        for order in orders.iterator(chunk_size=batch_size):
+            checked += 1
+            if set_computed_totals(order):
+                wrong.append(order)
+
+            if not options['check'] and len(wrong) >= batch_size:
+                fixed += repair([order.pk for order in wrong])
+                wrong = []
+
+        if options['check']:
+            if wrong:
+                raise CommandError('{0} of {1} orders have wrong totals: {2}'.format(
+                    len(wrong), checked, ', '.join(str(order.pk) for order in wrong[:20])))
+            self.stdout.write('All {0} order totals are correct'.format(checked))
+            return
+
+        if wrong:
+            fixed += repair([order.pk for order in wrong])
+        self.stdout.write('Checked {0} orders, fixed {1}'.format(checked, fixed))
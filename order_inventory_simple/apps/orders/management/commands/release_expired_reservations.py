@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Reservation
+
+
+class Command(BaseCommand):
+    help = ('Release the stock held by the expired reservations, in batches read from the '
+            'expires_at index. Concurrent runs skip the reservations another run is releasing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            batch = Reservation.release_expired(options['batch_size'])
+            if not batch:
+                break
+            released += batch
+        self.stdout.write('Released {0} reservations'.format(released))
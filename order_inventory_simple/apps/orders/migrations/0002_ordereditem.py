@@ -0,0 +1,32 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventories', '0002_inventory_status'),
+        ('orders', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='order',
+            name='inventory',
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='quantity',
+        ),
+        migrations.CreateModel(
+            name='OrderedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=1)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ordered_items', to='orders.Order')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ordered_items', to='inventories.Inventory')),
+            ],
+        ),
+    ]
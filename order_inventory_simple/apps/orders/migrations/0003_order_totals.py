@@ -0,0 +1,50 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:40
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def capture_prices_and_totals(apps, schema_editor):
+    Inventory = apps.get_model('inventories', 'Inventory')
+    Order = apps.get_model('orders', 'Order')
+    OrderedItem = apps.get_model('orders', 'OrderedItem')
+
+    # one UPDATE per table, the database does the per row work
+    OrderedItem.objects.update(
+        unit_price=Subquery(Inventory.objects.filter(pk=OuterRef('product_id')).values('price')[:1]))
+
+    items = OrderedItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+    Order.objects.update(
+        total_price=Coalesce(Subquery(
+            items.annotate(total=Sum(F('quantity') * F('unit_price'),
+                                     output_field=models.DecimalField(max_digits=12, decimal_places=2)))
+            .values('total')), Value(0)),
+        item_count=Coalesce(Subquery(items.annotate(count=Count('pk')).values('count')), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0002_ordereditem'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='ordereditem',
+            name='unit_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+            preserve_default=False,
+        ),
+        migrations.RunPython(capture_prices_and_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:37
+
+from decimal import Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicate_items(apps, schema_editor):
+    """Make the existing rows pass the new constraints.
+
+    Lines of the same product are merged into the oldest one and lines
+    without a positive quantity are dropped; the totals of the orders
+    touched are computed again.
+    """
+    Order = apps.get_model('orders', 'Order')
+    OrderedItem = apps.get_model('orders', 'OrderedItem')
+
+    changed_orders = set(OrderedItem.objects.filter(quantity__lte=0).values_list('order_id', flat=True))
+    OrderedItem.objects.filter(quantity__lte=0).delete()
+
+    kept = {}
+    for ordered_item in OrderedItem.objects.order_by('id').iterator():
+        key = (ordered_item.order_id, ordered_item.product_id)
+        if key not in kept:
+            kept[key] = ordered_item
+            continue
+        kept[key].quantity += ordered_item.quantity
+        kept[key].save(update_fields=['quantity'])
+        ordered_item.delete()
+        changed_orders.add(ordered_item.order_id)
+
+    for order_id in changed_orders:
+        ordered_items = list(OrderedItem.objects.filter(order_id=order_id).values_list('quantity', 'unit_price'))
+        Order.objects.filter(pk=order_id).update(
+            total_price=sum((quantity * unit_price for quantity, unit_price in ordered_items), Decimal(0)),
+            item_count=len(ordered_items))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_items, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['email', '-created_at'], name='order_email_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ordereditem',
+            constraint=models.UniqueConstraint(fields=('order', 'product'), name='ordereditem_order_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='ordereditem',
+            constraint=models.CheckConstraint(check=models.Q(quantity__gt=0), name='ordereditem_quantity_positive'),
+        ),
+        # the unique constraint starts with order_id, the index of the foreign key is redundant
+        migrations.AlterField(
+            model_name='ordereditem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ordered_items', to='orders.Order'),
+        ),
+    ]
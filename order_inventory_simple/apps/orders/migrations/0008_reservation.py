@@ -0,0 +1,46 @@
+# Generated by Django 3.0.2 on 2026-10-18 12:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventories', '0007_inventory_reserved_quantity'),
+        ('orders', '0007_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-updated_at'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='ReservedItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='reserved_items', to='inventories.Inventory')),
+                ('reservation', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='reserved_items', to='orders.Reservation')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reserveditem',
+            constraint=models.UniqueConstraint(fields=('reservation', 'product'), name='reserveditem_reservation_product_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='reserveditem',
+            constraint=models.CheckConstraint(check=models.Q(quantity__gt=0), name='reserveditem_quantity_positive'),
+        ),
+    ]
@@ -1,70 +1,358 @@
-from django.db import models
-from django.dispatch import receiver
-from django.db.models.signals import pre_delete, post_delete, post_save, pre_save
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Sum
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
-from ..core.models import TimeStampModel
-from ..inventories.models import Inventory
+from ..core.models import TimeStampModel, VersionConflict, VersionedModel
+from ..inventories.stock import apply_stock_deltas, collect_stock_deltas, merge_stock_deltas, reserve_stock
+from ..reports.rollup import collect_sales, merge_sales, record_sales
 
 
-class Order(TimeStampModel):
+class Order(VersionedModel, TimeStampModel):
     email = models.CharField(max_length=255)
     status = models.BooleanField(default=True)
-    
-    @property
-    def total_price(self):
-        return sum([item.product.price * item.quantity for item in self.ordered_items.select_related('product').all()])
+    #kept up to date whenever items are added, removed or replaced
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.PositiveIntegerField(default=0)
+
+    class Meta(TimeStampModel.Meta):
+        indexes = [
+            models.Index(fields=['-created_at', 'id'], name='order_created_id_idx'),
+            models.Index(fields=['email', '-created_at'], name='order_email_created_idx'),
+        ]
 
     def __str__(self):
         return self.email
 
+    @classmethod
+    def customer_summary(cls, email, queryset=None):
+        """Order count, lifetime spend and last order date of a customer, in one query."""
+        if queryset is None:
+            queryset = cls.objects.all()
+        summary = queryset.filter(email=email).aggregate(
+            order_count=Count('id'), lifetime_spend=Sum('total_price'), last_order_at=Max('created_at'))
+        summary['email'] = email
+        if summary['lifetime_spend'] is None:
+            summary['lifetime_spend'] = Decimal(0)
+        return summary
+
+    @classmethod
+    def create_with_items(cls, order_items, held=None, **order_data):
+        """Create an order with all its items in one INSERT and one stock update.
+
+        `held` is the stock of the reservation the order is confirming, see
+        apply_stock_deltas.
+        """
+        order = cls(**order_data)
+        new_items = order.build_order_items(order_items)
+        order.set_totals(new_items)
+        with transaction.atomic():
+            order.save()
+            for new_item in new_items:
+                new_item.order = order
+            OrderedItem.objects.bulk_create(new_items)
+            apply_stock_deltas(collect_stock_deltas(new_items), held)
+            record_sales(order.created_at, collect_sales(new_items))
+        return order
+
+    def build_order_items(self, order_items):
+        # capture the price now, later price changes must not alter the order
+        return [OrderedItem(order=self, unit_price=order_item['product'].price, **order_item)
+                for order_item in order_items]
+
+    def lock_items(self):
+        """Lock the order row until the end of the transaction and read its items.
+
+        Every change of the items of an order takes this lock first, so the
+        items read here stay current until the transaction ends and can be
+        diffed and totalled. The version and the totals of the order are read
+        again with the lock.
+        """
+        row = Order.objects.select_for_update().filter(pk=self.pk).values(
+            'version', 'total_price', 'item_count').first()
+        for field, value in (row or {}).items():
+            setattr(self, field, value)
+        return list(self.ordered_items.all())
+
+    def replace_order_items(self, order_items):
+        """Make the items of the order match `order_items`, touching only the lines that changed.
+
+        Lines are matched by product: new products are inserted, changed
+        quantities updated and missing products deleted. Kept lines keep their
+        unit price. The totals are set but the order is not saved. Must be
+        called in a transaction, the items are read under the lock of the order.
+        """
+        current_items = self.lock_items()
+        current = {item.product_id: item for item in current_items}
+        wanted = {order_item['product'].pk: order_item for order_item in order_items}
+
+        new_items = self.build_order_items([order_item for product_id, order_item in wanted.items()
+                                            if product_id not in current])
+        quantities = {item.pk: wanted[product_id]['quantity']
+                      for product_id, item in current.items() if product_id in wanted}
+        removed_items = [item for product_id, item in current.items() if product_id not in wanted]
+        self.apply_item_changes(current_items, new_items, quantities, removed_items)
+
+    def change_order_items(self, added=(), quantities=None, removed_ids=()):
+        """Add items, change quantities and remove items in one transaction and save the totals.
+
+        `added` are dicts with a `product` and a `quantity`, `quantities` maps
+        item ids to their new quantity and `removed_ids` are item ids. A
+        product may only be added when the order has no line for it left.
+        Removing an item that is not in the order does nothing, like
+        remove_order_item. The order is only saved, and its version bumped,
+        when an item changed. Returns the items of the order.
+        """
+        quantities = quantities or {}
+        with transaction.atomic():
+            current_items = self.lock_items()
+            current = {item.pk: item for item in current_items}
+            unknown = [item_id for item_id in quantities if item_id not in current]
+            if unknown:
+                raise ValidationError("Not found an order item with this ordered item id: {0}".format(unknown[0]))
+            removed_items = [current[item_id] for item_id in dict.fromkeys(removed_ids) if item_id in current]
+
+            if not added and not removed_items and all(
+                    current[item_id].quantity == quantity for item_id, quantity in quantities.items()):
+                expected_version, self.expected_version = self.expected_version, None
+                if expected_version not in (None, self.version):
+                    raise VersionConflict('{0} {1} is not at version {2}'.format(
+                        self._meta.verbose_name, self.pk, expected_version))
+                return current_items
+
+            products = {item.product_id for item in current_items if item not in removed_items}
+            for order_item in added:
+                if order_item['product'].pk in products:
+                    raise ValidationError("item exists already")
+                products.add(order_item['product'].pk)
+
+            items = self.apply_item_changes(
+                current_items, self.build_order_items(added), quantities, removed_items)
+            self.save(update_fields=['total_price', 'item_count', 'updated_at'])
+        return items
+
+    def apply_item_changes(self, current_items, new_items=(), quantities=None, removed_items=()):
+        """Insert `new_items`, set `quantities` ({item id: quantity}) and delete `removed_items`.
+
+        One query per kind of change, and the stock and the sales rollup move
+        once per product by the net difference. The totals are set from the
+        resulting items but the order is not saved. Returns those items.
+        """
+        quantities = quantities or {}
+        removed_ids = {item.pk for item in removed_items}
+        kept_items = [item for item in current_items if item.pk not in removed_ids]
+
+        deltas = merge_stock_deltas(collect_stock_deltas(new_items), collect_stock_deltas(removed_items, sign=-1))
+        sales = merge_sales(collect_sales(new_items), collect_sales(removed_items, sign=-1))
+        changed_items = []
+        for item in kept_items:
+            if item.pk in quantities and quantities[item.pk] != item.quantity:
+                difference = quantities[item.pk] - item.quantity
+                deltas[item.product_id] += difference
+                sales[item.product_id][0] += difference
+                sales[item.product_id][1] += difference * item.unit_price
+                item.quantity = quantities[item.pk]
+                changed_items.append(item)
+
+        with transaction.atomic(savepoint=False):
+            if removed_items:
+                OrderedItem.objects.filter(id__in=list(removed_ids)).delete()
+            if changed_items:
+                OrderedItem.objects.bulk_update(changed_items, ['quantity'])
+            if new_items:
+                OrderedItem.objects.bulk_create(new_items)
+            apply_stock_deltas(deltas)
+            record_sales(self.created_at, sales)
+
+        items = kept_items + list(new_items)
+        self.set_totals(items)
+        return items
+
+    def set_totals(self, order_items):
+        self.total_price = sum(item.total_price for item in order_items)
+        self.item_count = len(order_items)
+
+    def change_totals(self, order_items, sign=1):
+        price = sign * sum(item.total_price for item in order_items)
+        count = sign * len(order_items)
+        Order.objects.filter(pk=self.pk).update(
+            total_price=F('total_price') + price, item_count=F('item_count') + count, version=F('version') + 1)
+        self.total_price += price
+        self.item_count += count
+        self.version += 1
+
 
     def add_order_item(self, order_item_dict):
         # do not allow same product in order items twice  
         if self.ordered_items.filter(product=order_item_dict.get('product', None)).exists():
             raise ValidationError("item exists already")
-        self.ordered_items.create(**order_item_dict)
+        order_item = self.build_order_items([order_item_dict])[0]
+        with transaction.atomic():
+            order_item.save()
+            self.change_totals([order_item])
+            apply_stock_deltas(collect_stock_deltas([order_item]))
+            record_sales(self.created_at, collect_sales([order_item]))
+        return order_item
 
     def remove_order_item(self, order_item_id):
-        self.ordered_items.filter(id=order_item_id).delete()
+        with transaction.atomic():
+            order_items = list(self.ordered_items.filter(id=order_item_id))
+            if not order_items:
+                return
+            self.ordered_items.filter(id=order_item_id).delete()
+            self.change_totals(order_items, sign=-1)
+            apply_stock_deltas(collect_stock_deltas(order_items, sign=-1))
+            record_sales(self.created_at, collect_sales(order_items, sign=-1))
         
     
     def has_order_item(self, order_item):
         return self.ordered_items.filter(pk=order_item.pk).exists()
 
+    def release(self):
+        """Delete the order, put the stock of its items back and take its sales out of the rollup.
+
+        The items are read under the lock of the order, so only the release
+        that deleted the order moves the stock. Returns False if the order
+        was already deleted.
+        """
+        with transaction.atomic():
+            order_items = self.lock_items()
+            if not self.delete()[1].get(Order._meta.label, 0):
+                return False
+            apply_stock_deltas(collect_stock_deltas(order_items, sign=-1))
+            record_sales(self.created_at, collect_sales(order_items, sign=-1))
+        return True
+
 
 class OrderedItem(models.Model):
+    #indexed by the (order, product) constraint
     order = models.ForeignKey(
-        'Order', related_name='ordered_items', on_delete=models.CASCADE)
+        'Order', related_name='ordered_items', on_delete=models.CASCADE, db_index=False)
     product = models.ForeignKey(
         'inventories.Inventory', related_name='ordered_items', on_delete=models.PROTECT) #do not delete product when all orders deleted
     quantity = models.IntegerField(default=1)#order number 0 for an item makes no sense
+    unit_price = models.DecimalField(max_digits=5, decimal_places=2) #product price when ordered
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'product'], name='ordereditem_order_product_uniq'),
+            models.CheckConstraint(check=models.Q(quantity__gt=0), name='ordereditem_quantity_positive'),
+        ]
+
+    @property
+    def total_price(self):
+        return self.unit_price * self.quantity
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.product.price
+        super().save(*args, **kwargs)
 
 
-@receiver(post_save, sender=OrderedItem)
-def save_change_inventory(sender, instance, created, *args, **kwargs):
-    quantity = instance.quantity
-    product_id = instance.product.id
-    product = Inventory.objects.get(id=product_id)#get product from the db, it could have been changed 
-    if  not product.status:
-        raise ValidationError("Can not order this product(name:{0}), the product status is not active".format(product.name)) 
-       
-    product.quantity = product.quantity - quantity
+class Reservation(TimeStampModel):
+    """Stock held for a checkout until it is confirmed into an order, released or expired.
 
-    if product.quantity<0:
-        raise ValidationError("Out of stock, no enough this product: {0}".format(product.name)) 
+    The held quantities are counted in `Inventory.reserved_quantity`. A
+    reservation is deleted when it ends, the first of confirm, release and
+    the expiry sweep to delete it gets to move its stock.
+    """
+    email = models.CharField(max_length=255, blank=True)
+    #read by the sweep of release_expired_reservations
+    expires_at = models.DateTimeField(db_index=True)
 
-    product.save()
+    def __str__(self):
+        return '{0} until {1}'.format(self.pk, self.expires_at.isoformat())
 
-@receiver(pre_delete, sender=OrderedItem)
-def pre_delete_change_inventory(sender, instance, *args, **kwargs):
-    quantity = instance.quantity
-    product_id = instance.product.id
-    product = Inventory.objects.get(id=product_id)
+    @property
+    def expired(self):
+        return self.expires_at <= timezone.now()
 
-    product.quantity = product.quantity + quantity
-    product.save() 
+    @classmethod
+    def hold(cls, items, ttl, **reservation_data):
+        """Hold `items`, dicts with a `product` and a `quantity`, for `ttl` seconds."""
+        reservation = cls(expires_at=timezone.now() + timedelta(seconds=ttl), **reservation_data)
+        held_items = [ReservedItem(reservation=reservation, **item) for item in items]
+        with transaction.atomic():
+            reservation.save()
+            for held_item in held_items:
+                held_item.reservation = reservation
+            ReservedItem.objects.bulk_create(held_items)
+            reserve_stock(collect_stock_deltas(held_items))
+        return reservation
 
+    def claim(self, **conditions):
+        """Delete the reservation unless another confirm, release or sweep did, returns whether it did."""
+        deleted = Reservation.objects.filter(pk=self.pk, **conditions).delete()[1]
+        return deleted.get(Reservation._meta.label, 0) > 0
 
-        
+    def release(self):
+        """Put the held stock back, returns False if the reservation had already ended."""
+        with transaction.atomic():
+            held_items = list(self.reserved_items.all())
+            if not self.claim():
+                return False
+            reserve_stock(collect_stock_deltas(held_items, sign=-1))
+        return True
+
+    def confirm(self, **order_data):
+        """Turn the held items into an order at the current prices, None if the reservation ended.
+
+        The order takes the held stock with the same UPDATE that releases it.
+        """
+        with transaction.atomic():
+            held_items = list(self.reserved_items.select_related('product'))
+            if not self.claim(expires_at__gt=timezone.now()):
+                return None
+            order_data.setdefault('email', self.email)
+            return Order.create_with_items(
+                [{'product': item.product, 'quantity': item.quantity} for item in held_items],
+                held=collect_stock_deltas(held_items), **order_data)
+
+    @classmethod
+    def release_expired(cls, batch_size=500, now=None):
+        """Release one batch of the expired reservations, oldest first, returns how many.
+
+        Concurrent sweeps skip the reservations another one is releasing.
+        """
+        with transaction.atomic():
+            ids = list(cls.objects.filter(expires_at__lte=now or timezone.now()).order_by('expires_at')
+                       .select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return 0
+            held_items = list(ReservedItem.objects.filter(reservation_id__in=ids))
+            ReservedItem.objects.filter(reservation_id__in=ids).delete()
+            cls.objects.filter(id__in=ids).delete()
+            reserve_stock(collect_stock_deltas(held_items, sign=-1))
+        return len(ids)
+
+
+class ReservedItem(models.Model):
+    #indexed by the (reservation, product) constraint
+    reservation = models.ForeignKey(
+        'Reservation', related_name='reserved_items', on_delete=models.CASCADE, db_index=False)
+    product = models.ForeignKey(
+        'inventories.Inventory', related_name='reserved_items', on_delete=models.PROTECT)
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reservation', 'product'], name='reserveditem_reservation_product_uniq'),
+            models.CheckConstraint(check=models.Q(quantity__gt=0), name='reserveditem_quantity_positive'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """A submitted Idempotency-Key and the response to replay for it."""
+    key = models.CharField(max_length=255, unique=True)
+    request_hash = models.CharField(max_length=64) #sha256 of the request body
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.TextField(blank=True)
+    response_headers = models.TextField(blank=True) #JSON of the idempotency.STORED_HEADERS of the response
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
@@ -5,3 +5,16 @@ class OrderJSONRenderer(OrderInventoryJSONRenderer):
 
     label = 'order'
     label_plural = 'orders'
+    side_maps = ('products',)
+
+
+class ReservationJSONRenderer(OrderInventoryJSONRenderer):
+
+    label = 'reservation'
+    label_plural = 'reservations'
+
+
+class CustomerJSONRenderer(OrderInventoryJSONRenderer):
+
+    label = 'customer'
+    label_plural = 'customers'
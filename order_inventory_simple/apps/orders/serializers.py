@@ -1,15 +1,69 @@
+from django.conf import settings
 from rest_framework import serializers
+from django.db import transaction
 from django.db.models import F
 
-from .models import Order, OrderedItem
+from ..core.fields import IsoformatField
+from ..core.sparse import SparseFieldsMixin
+from .models import Order, OrderedItem, Reservation, ReservedItem
 from ..inventories.models import Inventory
+from ..inventories import cache
 from ..inventories.serializers import InventorySerializer
 
-class OrderedItemCreateSerializer(serializers.ModelSerializer):
+
+def validate_lines_together(lines, field_name, held=None):
+    """Load every product of `lines` at once and check all lines in memory.
+
+    The products replace their ids in `lines`. `held` is the stock per
+    product the lines may take on top of the available quantity. Errors are
+    reported per line under `field_name`, like the errors of the nested
+    serializer.
+    """
+    held = held or {}
+    products = cache.get_many_by_id([line['product'] for line in lines])
+
+    errors = [{} for _ in lines]
+    seen = set()
+    for line, line_errors in zip(lines, errors):
+        product_id = line['product']
+        product = products.get(product_id, None)
+        if product is None:
+            line_errors['product'] = ['Invalid pk "{0}" - object does not exist.'.format(product_id)]
+            continue
+        if product_id in seen:
+            line_errors['product'] = ["item exists already"]
+            continue
+        seen.add(product_id)
+        if not product.status:
+            line_errors['product'] = ["Can not order this product(name:{0}), the product status is not active".format(product.name)]
+        elif product.available_quantity + held.get(product_id, 0) < line['quantity']:
+            line_errors['quantity'] = ["Out of stock, no enough this product: {0}".format(product.name)]
+        line['product'] = product
+
+    if any(errors):
+        raise serializers.ValidationError({field_name: errors})
+
+
+class ProductIdField(serializers.PrimaryKeyRelatedField):
+    """Only checks the id, OrderSerializer.validate loads all products of an order at once."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class OrderedItemCreateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    product = ProductIdField(queryset=Inventory.objects.all())
     
     class Meta:
         model = OrderedItem
-        fields = ('id', 'quantity', 'product')
+        fields = ('id', 'quantity', 'product', 'unit_price')
+        read_only_fields = ('unit_price',)
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
     def save(self, *args, **kwargs):
             super().save(*args, **kwargs)
@@ -21,25 +75,28 @@ class OrderedItemCreateSerializer(serializers.ModelSerializer):
         return instance
 
    
-class OrderedItemDetailedSerializer(serializers.ModelSerializer):
+class OrderedItemDetailedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     product = InventorySerializer()
 
     class Meta:
         model = OrderedItem
-        fields = ( 'id', 'quantity', 'product')
+        fields = ( 'id', 'quantity', 'product', 'unit_price')
+        read_only_fields = ('unit_price',)
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     email = serializers.CharField(max_length=255, required=True)
-    createdAt = serializers.SerializerMethodField(method_name='get_created_at')
-    updatedAt = serializers.SerializerMethodField(method_name='get_updated_at')
+    createdAt = IsoformatField(source='created_at')
+    updatedAt = IsoformatField(source='updated_at')
     status  = serializers.BooleanField(required=False, allow_null=True)
     ordered_items = OrderedItemCreateSerializer(many=True)
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, coerce_to_string=False, read_only=True)
 
     class Meta:
         model = Order
         fields = ('id', 'email', 'status',
-                  'createdAt', 'updatedAt','ordered_items', 'total_price')
+                  'createdAt', 'updatedAt','ordered_items', 'total_price', 'item_count')
+        read_only_fields = ('item_count',)
 
     def validate(self, data):
         
@@ -47,18 +104,24 @@ class OrderSerializer(serializers.ModelSerializer):
         if ordered_items is None:
             raise serializers.ValidationError("Must order some items")
         if ordered_items:
-            for ordered_item in ordered_items:
-                if ordered_item.get('product').quantity< ordered_item.get('quantity'):
-                    raise serializers.ValidationError("Out of stock, no enough this product")
+            self.validate_ordered_items_together(ordered_items)
         return data
 
+    def validate_ordered_items_together(self, ordered_items):
+        # stock held by the order being updated is given back before the new items are taken.
+        # only a pre-check: the update diffs against the items read again under the lock of the order
+        held = {}
+        if self.instance is not None:
+            for item in self.instance.ordered_items.all():
+                held[item.product_id] = held.get(item.product_id, 0) + item.quantity
+
+        validate_lines_together(ordered_items, 'ordered_items', held)
+
     def create(self, validated_data):
         request = self.context.get('request', None)
 
         order_items = validated_data.pop('ordered_items')
-        instance = Order.objects.create( **validated_data)
-        for order_item in order_items:
-            instance.ordered_items.create(**order_item)
+        instance = Order.create_with_items(order_items, **validated_data)
 
         return instance
 
@@ -68,43 +131,75 @@ class OrderSerializer(serializers.ModelSerializer):
 
         for (key, value) in validated_data.items():
             setattr(instance, key, value) 
-              
-        instance.save()
 
-        if ordered_items is not None:
-            prev_all_items = instance.ordered_items.all().delete()
-
-            for ordered_item in ordered_items:
-                created_ordered_item = instance.ordered_items.create(
-                    **ordered_item)
+        with transaction.atomic():
+            if ordered_items is not None:
+                instance.replace_order_items(ordered_items)
+            instance.save()
 
         return instance
 
 
-    def get_created_at(self, instance):
+class OrderDetailedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    ordered_items = OrderedItemDetailedSerializer(many=True)
+    createdAt = IsoformatField(source='created_at')
+    updatedAt = IsoformatField(source='updated_at')
+    total_price = serializers.DecimalField(max_digits=12, decimal_places=2, coerce_to_string=False, read_only=True)
 
-        return instance.created_at.isoformat()
+    class Meta:
+        model = Order
+        fields = ('id', 'email', 'status',
+                  'createdAt', 'updatedAt','ordered_items', 'total_price', 'item_count')
 
-    def get_updated_at(self, instance):
 
-        return instance.updated_at.isoformat()
+class ReservedItemSerializer(serializers.ModelSerializer):
+    product = ProductIdField(queryset=Inventory.objects.all())
 
+    class Meta:
+        model = ReservedItem
+        fields = ('id', 'product', 'quantity')
+        extra_kwargs = {'quantity': {'min_value': 1}}
 
-class OrderDetailedSerializer(serializers.ModelSerializer):
-    ordered_items = OrderedItemDetailedSerializer(many=True)
-    createdAt = serializers.SerializerMethodField(method_name='get_created_at')
-    updatedAt = serializers.SerializerMethodField(method_name='get_updated_at')
+
+class ReservationSerializer(serializers.ModelSerializer):
+    """Holds the items for `ttl` seconds, RESERVATION_TTL by default."""
+    email = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    items = ReservedItemSerializer(many=True, source='reserved_items')
+    ttl = serializers.IntegerField(write_only=True, required=False, min_value=1,
+                                   max_value=getattr(settings, 'RESERVATION_MAX_TTL', 3600))
+    createdAt = IsoformatField(source='created_at')
+    expiresAt = IsoformatField(source='expires_at')
 
     class Meta:
-        model = Order
-        fields = ('id', 'email', 'status',
-                  'createdAt', 'updatedAt','ordered_items', 'total_price')
+        model = Reservation
+        fields = ('id', 'email', 'items', 'ttl', 'createdAt', 'expiresAt')
+
+    def validate(self, data):
+        if not data.get('reserved_items', None):
+            raise serializers.ValidationError("Must hold some items")
+        validate_lines_together(data['reserved_items'], 'items')
+        return data
+
+    def create(self, validated_data):
+        items = validated_data.pop('reserved_items')
+        ttl = validated_data.pop('ttl', getattr(settings, 'RESERVATION_TTL', 900))
+        return Reservation.hold(items, ttl, **validated_data)
+
+
+class OrderItemQuantitySerializer(serializers.Serializer):
+    item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
 
-    def get_created_at(self, instance):
-    
-        return instance.created_at.isoformat()
 
-    def get_updated_at(self, instance):
+class OrderItemChangesSerializer(serializers.Serializer):
+    """Items to add, quantities to change and items to remove, applied together."""
+    add = OrderedItemCreateSerializer(many=True, required=False)
+    change = OrderItemQuantitySerializer(many=True, required=False)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False)
 
-        return instance.updated_at.isoformat()
 
+class CustomerSummarySerializer(serializers.Serializer):
+    email = serializers.CharField()
+    order_count = serializers.IntegerField()
+    lifetime_spend = serializers.DecimalField(max_digits=14, decimal_places=2, coerce_to_string=False)
+    last_order_at = serializers.DateTimeField(allow_null=True)
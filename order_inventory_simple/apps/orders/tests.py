@@ -1,16 +1,46 @@
+import asyncio
 import simplejson as json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
 
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import caches
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.db.models import Prefetch
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.urls import reverse
+from rest_framework import serializers
+from rest_framework.response import Response
 from rest_framework.test import APITestCase, APIClient
+from rest_framework.utils.serializer_helpers import ReturnList
 from rest_framework.views import status
+from ..core import metrics
+from ..core.asgi import PooledASGIHandler
+from ..core.fast import reader_for
+from ..core.models import VersionConflict
+from ..core.sparse import select_fields
 from ..inventories.models import Inventory
 from ..inventories.serializers import InventorySerializer
+from ..inventories.stock import apply_stock_deltas
 
-from .models import Order
+from . import idempotency
+from .models import IdempotencyKey, Order, OrderedItem, Reservation, ReservedItem
+from .renderers import OrderJSONRenderer
 from .serializers import OrderSerializer, OrderDetailedSerializer
 
 
 def setUpInventory(__self):
+    # rolled back ids are reused and the cache is only invalidated on commit
+    caches['default'].clear()
     __self.first = Inventory.objects.create(
         name='test_product101', description="good101", price=321.22, quantity=300)
     __self.second = Inventory.objects.create(
@@ -55,13 +85,27 @@ class GetAllOrders(APITestCase):
         #test the quantity in corresponding inventory has been changed
         self.assertEqual(real_qt_list == expect_qt_list, True)
 
-        expected = Order.objects.all()
+        expected = Order.objects.order_by('-created_at', 'id')
         response = self.client.get(reverse("orders:order-list"))
 
         serializer = OrderSerializer(expected, many=True)
-        self.assertEqual(response.data, serializer.data)
+        self.assertEqual(response.data['results'], serializer.data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_paginate_orders(self):
+        expected_ids = list(Order.objects.order_by('-created_at', 'id').values_list('id', flat=True))
+
+        response = self.client.get(reverse("orders:order-list"), {'page_size': 2})
+        content = json.loads(response.content)
+        self.assertEqual([order['id'] for order in content['orders']], expected_ids[:2])
+        self.assertIsNone(content['previous'])
+
+        response = self.client.get(content['next'])
+        content = json.loads(response.content)
+        self.assertEqual([order['id'] for order in content['orders']], expected_ids[2:])
+        self.assertIsNone(content['next'])
+        self.assertIsNotNone(content['previous'])
+
 
 class CreateNewOrderTest(APITestCase):
 
@@ -282,6 +326,15 @@ class DeleteSingleOrderTest(APITestCase):
         self.assertEqual(inventory_serialized.data.get("quantity"), 299)
         #before delete order, the product quantity was 298, only order with email test2@test.com exists
 
+    def test_release_twice_restocks_once(self):
+        first_copy = Order.objects.get(email="test1@test.com")
+        second_copy = Order.objects.get(email="test1@test.com")
+
+        self.assertTrue(first_copy.release())
+        self.assertFalse(second_copy.release())
+
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 299)
+
     def test_invalid_delete_order(self):
         response = self.client.delete(
             reverse("orders:order-detail", kwargs={'pk': 1000}))
@@ -291,3 +344,1020 @@ class DeleteSingleOrderTest(APITestCase):
    
 
 
+
+
+class BulkCreateOrderTest(APITestCase):
+    """ Test module for the query count of creating large orders """
+
+    def setUp(self):
+        #the rows are bulk created without signals, drop what earlier tests cached under the same ids
+        caches['default'].clear()
+        Inventory.objects.bulk_create([
+            Inventory(name='bulk_product{0}'.format(i), slug='bulk-product{0}'.format(i),
+                      description="bulk", price=1.5, quantity=10)
+            for i in range(500)])
+        self.product_ids = list(Inventory.objects.order_by('id').values_list('id', flat=True))
+
+    def create_order(self, lines, num_queries):
+        order_data = {"email": "bulk@test.com",
+                      "ordered_items": [{"quantity": 2, "product": product_id}
+                                        for product_id in self.product_ids[:lines]]}
+        serializer = OrderSerializer(data=order_data)
+        serializer.is_valid(raise_exception=True)
+
+        with self.assertNumQueries(num_queries):
+            serializer.save()
+
+        self.assertEqual(serializer.instance.ordered_items.count(), lines)
+        self.assertEqual(list(Inventory.objects.filter(quantity=8).values_list('id', flat=True).order_by('id')),
+                         self.product_ids[:lines])
+
+    def test_create_order_with_1_line(self):
+        #savepoint, order insert, items insert, stock update, low stock check,
+        #sales rollup insert and update, release
+        self.create_order(1, 8)
+
+    def test_create_order_with_10_lines(self):
+        self.create_order(10, 8)
+
+    def test_create_order_with_500_lines(self):
+        #items are inserted in 3 batches, stock updated and checked in 3 batches, the sales rollup
+        #takes 3 updates and 5 inserts as sqlite splits the batches of 200 rows
+        self.create_order(500, 20)
+
+
+class IncrementalOrderUpdateTest(APITestCase):
+    """ Test module for updating only the changed lines of an order """
+
+    def setUp(self):
+        caches['default'].clear()
+        Inventory.objects.bulk_create([
+            Inventory(name='diff_product{0}'.format(i), slug='diff-product{0}'.format(i),
+                      description="diff", price=1.5, quantity=10)
+            for i in range(102)])
+        self.product_ids = list(Inventory.objects.order_by('id').values_list('id', flat=True))
+        self.order = Order.create_with_items(
+            [{"product": product, "quantity": 2} for product in Inventory.objects.order_by('id')[:100]],
+            email="diff@test.com")
+
+    def update_order(self, ordered_items, num_queries):
+        serializer = OrderSerializer(self.order, data={"ordered_items": ordered_items}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with self.assertNumQueries(num_queries):
+            serializer.save()
+        return Order.objects.get(pk=self.order.pk)
+
+    def test_edit_one_line_of_100(self):
+        ordered_items = [{"quantity": 2, "product": product_id} for product_id in self.product_ids[:100]]
+        ordered_items[5]['quantity'] = 5
+        item_ids = set(self.order.ordered_items.values_list('id', flat=True))
+
+        #savepoint, order lock, items read, items update, stock update, low stock check,
+        #sales rollup insert and update, order update, version read, release
+        order = self.update_order(ordered_items, 11)
+
+        self.assertEqual(set(order.ordered_items.values_list('id', flat=True)), item_ids)
+        self.assertEqual(Inventory.objects.get(pk=self.product_ids[5]).quantity, 5)
+        self.assertEqual(Inventory.objects.filter(quantity=8).count(), 99)
+        self.assertEqual(order.total_price, Decimal('304.50'))
+        self.assertEqual(order.item_count, 100)
+
+    def test_add_change_and_remove_lines(self):
+        Inventory.objects.filter(pk=self.product_ids[0]).update(price=100)
+        ordered_items = [{"quantity": 1, "product": self.product_ids[0]},
+                         {"quantity": 3, "product": self.product_ids[100]}]
+
+        #savepoint, order lock, items read, items delete, update and insert, stock update,
+        #low stock check, sales rollup insert and update, order update, version read, release
+        order = self.update_order(ordered_items, 13)
+
+        self.assertEqual(sorted(order.ordered_items.values_list('product_id', 'quantity', 'unit_price')),
+                         [(self.product_ids[0], 1, Decimal('1.50')), (self.product_ids[100], 3, Decimal('1.50'))])
+        self.assertEqual(Inventory.objects.get(pk=self.product_ids[0]).quantity, 9)
+        self.assertEqual(Inventory.objects.get(pk=self.product_ids[1]).quantity, 10)
+        self.assertEqual(Inventory.objects.get(pk=self.product_ids[100]).quantity, 7)
+        self.assertEqual(order.total_price, Decimal('6.00'))
+        self.assertEqual(order.item_count, 2)
+
+    def test_diff_against_the_items_at_the_update(self):
+        first_item = self.order.ordered_items.get(product_id=self.product_ids[0])
+        ordered_items = [{"quantity": 2, "product": product_id} for product_id in self.product_ids[:100]]
+        ordered_items[0]['quantity'] = 5
+        serializer = OrderSerializer(self.order, data={"ordered_items": ordered_items}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        #the line is removed between the validation and the update
+        Order.objects.get(pk=self.order.pk).change_order_items(removed_ids=[first_item.pk])
+
+        serializer.save()
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.ordered_items.get(product_id=self.product_ids[0]).quantity, 5)
+        self.assertEqual(Inventory.objects.get(pk=self.product_ids[0]).quantity, 5)
+        self.assertEqual(order.total_price, Decimal('304.50'))
+        self.assertEqual(order.item_count, 100)
+
+
+class BatchedOrderItemTest(APITestCase):
+    """ Test module for changing several items of an order in one request """
+
+    def setUp(self):
+        caches['default'].clear()
+        setUpInventory(self)
+        self.order = Order.create_with_items(
+            [{"product": self.first, "quantity": 2}, {"product": self.second, "quantity": 1}],
+            email="batch@test.com")
+        self.first_item = self.order.ordered_items.get(product=self.first)
+        self.second_item = self.order.ordered_items.get(product=self.second)
+        self.url = reverse("orders:order_item", kwargs={'order_id': self.order.pk})
+
+    def send(self, method, data):
+        return getattr(self.client, method)(self.url, data=json.dumps(data), content_type='application/json')
+
+    def quantities(self):
+        return {product_id: Inventory.objects.get(pk=product_id).quantity
+                for product_id in (self.first.pk, self.second.pk, self.third.pk, self.fourth.pk)}
+
+    def test_add_several_items(self):
+        response = self.send('post', [{"product": self.third.pk, "quantity": 2},
+                                      {"product": self.fourth.pk, "quantity": 1}])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data.get('item_count'), 4)
+        self.assertEqual(response.data.get('total_price'), Decimal('1935.32'))
+        self.assertEqual(self.quantities(), {self.first.pk: 298, self.second.pk: 299,
+                                             self.third.pk: 298, self.fourth.pk: 299})
+
+    def test_patch_changes_quantities(self):
+        response = self.send('patch', {"item_id": self.first_item.pk, "quantity": 5})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('total_price'), Decimal('1928.32'))
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 295)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total_price, Decimal('1928.32'))
+
+    def test_mixed_changes_take_one_stock_update(self):
+        #order, products, savepoint, order lock, items, items delete, update and insert, stock update,
+        #low stock check, sales rollup insert and update, order update, version read, release,
+        #then the items of the response
+        with self.assertNumQueries(16):
+            response = self.send('patch', {"add": [{"product": self.third.pk, "quantity": 3}],
+                                           "change": [{"item_id": self.first_item.pk, "quantity": 1}],
+                                           "remove": [self.second_item.pk]})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted((item['product'], item['quantity']) for item in response.data['ordered_items']),
+                         [(self.first.pk, 1), (self.third.pk, 3)])
+        self.assertEqual(response.data.get('total_price'), Decimal('1290.88'))
+        self.assertEqual(response.data.get('item_count'), 2)
+        self.assertEqual(self.quantities(), {self.first.pk: 299, self.second.pk: 300,
+                                             self.third.pk: 297, self.fourth.pk: 300})
+
+    def test_remove_several_items(self):
+        response = self.send('delete', [self.first_item.pk, {"item_id": self.second_item.pk}])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data.get('item_count'), 0)
+        self.assertFalse(self.order.ordered_items.exists())
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 300)
+
+    def test_no_change_keeps_the_version(self):
+        etag = self.client.get(reverse("orders:order-detail", kwargs={'pk': self.order.pk}))['ETag']
+
+        for method, data in (('delete', {"item_id": 0}), ('delete', {}),
+                             ('patch', {"item_id": self.first_item.pk, "quantity": 2})):
+            response = self.send(method, data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['ETag'], etag)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, self.order.version)
+
+        response = self.client.delete(self.url, data=json.dumps({"item_id": 0}), content_type='application/json',
+                                      HTTP_IF_MATCH='"{0}-0"'.format(self.order.pk))
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+
+    def test_failed_change_changes_nothing(self):
+        response = self.send('patch', {"add": [{"product": self.third.pk, "quantity": 1}],
+                                       "change": [{"item_id": self.first_item.pk, "quantity": 301}]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.send('post', [{"product": self.third.pk, "quantity": 1},
+                                      {"product": self.first.pk, "quantity": 1}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.send('patch', [{"item_id": self.first_item.pk, "quantity": 0}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(self.order.ordered_items.count(), 2)
+        self.assertEqual(self.quantities(), {self.first.pk: 298, self.second.pk: 299,
+                                             self.third.pk: 300, self.fourth.pk: 300})
+
+    def test_unknown_product_is_not_found(self):
+        response = self.send('post', {"product": 1000, "quantity": 1})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalOrderTest(APITestCase):
+    """ Test module for the ETags and conditional requests of orders """
+
+    def setUp(self):
+        setUpInventory(self)
+        self.order = Order.create_with_items([{"product": self.first, "quantity": 2}], email="etag@test.com")
+        self.url = reverse("orders:order-detail", kwargs={'pk': self.order.pk})
+
+    def patch(self, data, etag):
+        return self.client.patch(self.url, data=json.dumps(data), content_type='application/json',
+                                 HTTP_IF_MATCH=etag)
+
+    def test_unchanged_order_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(etag, '"{0}-1"'.format(self.order.pk))
+
+        #only the order is read, nothing is serialized
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH='W/{0}'.format(etag))
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+        self.client.post(reverse("orders:order_item", kwargs={'order_id': self.order.pk}),
+                         data=json.dumps({"product": self.second.pk, "quantity": 1}),
+                         content_type='application/json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"{0}-2"'.format(self.order.pk))
+
+    def test_save_of_a_stale_copy_moves_the_version_on(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.order.change_totals([], sign=1)
+        self.order.change_totals([], sign=1)
+
+        stale.email = "changed@test.com"
+        stale.save()
+
+        #the two updates of the totals and the save, no version is used twice
+        self.assertEqual(stale.version, 4)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, 4)
+
+    def test_update_with_current_version(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.patch({"ordered_items": [{"product": self.first.pk, "quantity": 3}]}, etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], '"{0}-2"'.format(self.order.pk))
+
+        #the second writer read the same version and loses
+        response = self.patch({"ordered_items": [{"product": self.first.pk, "quantity": 5}]}, etag)
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.order.ordered_items.get().quantity, 3)
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 297)
+
+    def test_conflicting_save_is_rolled_back(self):
+        order = Order.objects.get(pk=self.order.pk)
+        Order.objects.get(pk=self.order.pk).save()
+
+        serializer = OrderSerializer(order, data={"ordered_items": [{"product": self.first.pk, "quantity": 4}]},
+                                     partial=True)
+        serializer.is_valid(raise_exception=True)
+        order.expected_version = 1
+        with self.assertRaises(VersionConflict):
+            serializer.save()
+
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, 2)
+        self.assertEqual(self.order.ordered_items.get().quantity, 2)
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 298)
+
+    def test_order_items_honour_if_match(self):
+        response = self.client.patch(
+            reverse("orders:order_item", kwargs={'order_id': self.order.pk}),
+            data=json.dumps({"item_id": self.order.ordered_items.get().pk, "quantity": 1}),
+            content_type='application/json', HTTP_IF_MATCH='"{0}-7"'.format(self.order.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(self.order.ordered_items.get().quantity, 2)
+
+
+class SparseOrderTest(APITestCase):
+    """ Test module for selecting the fields of the order responses """
+
+    def setUp(self):
+        setUpInventory(self)
+        self.first_order = Order.create_with_items(
+            [{"product": self.first, "quantity": 2}, {"product": self.second, "quantity": 1}],
+            email="sparse1@test.com")
+        self.second_order = Order.create_with_items(
+            [{"product": self.first, "quantity": 1}], email="sparse2@test.com")
+
+    def get_list(self, params, num_queries):
+        with CaptureQueriesContext(connection) as queries, self.assertNumQueries(num_queries):
+            response = self.client.get(reverse("orders:order-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, ' '.join(query['sql'] for query in queries)
+
+    def test_selected_fields_only(self):
+        #the items are not read when they are not selected
+        response, sql = self.get_list({'fields': 'id,total_price'}, 1)
+
+        self.assertEqual([dict(order) for order in response.data['results']],
+                         [{'id': self.second_order.pk, 'total_price': Decimal('321.22')},
+                          {'id': self.first_order.pk, 'total_price': Decimal('964.66')}])
+        self.assertNotIn('"email"', sql)
+
+    def test_nested_fields(self):
+        response, sql = self.get_list({'fields': 'id,ordered_items.quantity'}, 2)
+
+        self.assertEqual([dict(item) for item in response.data['results'][1]['ordered_items']],
+                         [{'quantity': 2}, {'quantity': 1}])
+        self.assertNotIn('"unit_price"', sql)
+
+    def test_expanded_products_read_selected_columns(self):
+        response, sql = self.get_list(
+            {'expand': 'product', 'fields': 'id,ordered_items.quantity,ordered_items.product.name'}, 2)
+
+        self.assertEqual([dict(item['product']) for item in response.data['results'][1]['ordered_items']],
+                         [{'name': 'test_product101'}, {'name': 'test_product102'}])
+        self.assertNotIn('"description"', sql)
+
+    def test_products_side_map(self):
+        #orders, items, then every product once
+        response, sql = self.get_list({'expand': 'products', 'fields': 'id,ordered_items,products.name'}, 3)
+
+        body = json.loads(response.content)
+        self.assertEqual(body['products'], {str(self.first.pk): {'name': 'test_product101'},
+                                            str(self.second.pk): {'name': 'test_product102'}})
+        self.assertEqual(body['orders'][1]['ordered_items'][0]['product'], self.first.pk)
+        self.assertNotIn('"description"', sql)
+
+    def test_retrieve_with_products_side_map(self):
+        response = self.client.get(reverse("orders:order-detail", kwargs={'pk': self.second_order.pk}),
+                                   {'expand': 'products', 'fields': 'email,products.price'})
+
+        body = json.loads(response.content)
+        self.assertEqual(body['order'], {'email': 'sparse2@test.com'})
+        self.assertEqual(body['products'], {str(self.first.pk): {'price': '321.22'}})
+        self.assertIn('ETag', response)
+
+    def test_unknown_field_or_expansion(self):
+        response = self.client.get(reverse("orders:order-list"), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse("orders:order-list"), {'expand': 'customer'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastReaderTest(APITestCase):
+    """ Test module for the compiled readers of the read responses """
+
+    def setUp(self):
+        setUpInventory(self)
+        Order.create_with_items(
+            [{"product": self.first, "quantity": 2}, {"product": self.second, "quantity": 1}],
+            email="fast1@test.com", status=False)
+        Order.create_with_items([{"product": self.third, "quantity": 3}], email="fast2@test.com")
+        self.orders = list(Order.objects.prefetch_related(
+            Prefetch('ordered_items', queryset=OrderedItem.objects.select_related('product'))))
+
+    def assertSameJSON(self, serializer_class, instances, selected_fields=None):
+        renderer = OrderJSONRenderer()
+        serializer = select_fields(serializer_class(instances, many=True), selected_fields)
+        reader = reader_for(serializer_class, selected_fields)
+        self.assertEqual(renderer.render(reader.many(instances)), renderer.render(serializer.data))
+        for instance in instances:
+            serializer = select_fields(serializer_class(instance), selected_fields)
+            self.assertEqual(renderer.render(reader.one(instance)), renderer.render(serializer.data))
+
+    def test_same_json_as_the_serializers(self):
+        self.assertSameJSON(OrderSerializer, self.orders)
+        self.assertSameJSON(OrderDetailedSerializer, self.orders)
+        self.assertSameJSON(InventorySerializer, list(Inventory.objects.all()))
+
+    def test_same_json_for_selected_fields(self):
+        self.assertSameJSON(OrderDetailedSerializer, self.orders,
+                            {'id': {}, 'ordered_items': {'unit_price': {}, 'product': {'name': {}, 'price': {}}}})
+
+    def test_same_values_for_other_sources(self):
+        class ItemSerializer(serializers.ModelSerializer):
+            product_name = serializers.ReadOnlyField(source='product.name')
+            product_quantity = serializers.IntegerField(source='product.quantity', read_only=True)
+            order_email = serializers.CharField(source='order.email', read_only=True)
+            whole_price = serializers.IntegerField(source='unit_price', read_only=True)
+            total = serializers.ReadOnlyField(source='total_price')
+
+            class Meta:
+                model = OrderedItem
+                fields = ('id', 'product_name', 'product_quantity', 'order_email', 'whole_price', 'total')
+
+        reader = reader_for(ItemSerializer)
+        #the relations of an unsaved item are missing
+        for item in list(OrderedItem.objects.select_related('order', 'product')) + \
+                [OrderedItem(quantity=2, unit_price=Decimal('1.50'))]:
+            self.assertEqual(reader.read(item), ItemSerializer(item).data)
+        self.assertEqual(reader.read(OrderedItem(quantity=2, unit_price=Decimal('1.50')))['whole_price'], 1)
+
+    def test_reader_is_compiled_once(self):
+        self.assertIs(reader_for(OrderSerializer, {'id': {}}), reader_for(OrderSerializer, {'id': {}}))
+
+
+class ReservationTest(APITestCase):
+    """ Test module for holding stock with reservations """
+
+    def setUp(self):
+        caches['default'].clear()
+        setUpInventory(self)
+
+    def hold(self, items, **data):
+        data['items'] = items
+        return self.client.post(reverse("orders:reservation-list"), data=json.dumps(data),
+                                content_type='application/json')
+
+    def stock(self, product):
+        return Inventory.objects.values_list('quantity', 'reserved_quantity').get(pk=product.pk)
+
+    def expire(self, reservation_id):
+        Reservation.objects.filter(pk=reservation_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_held_stock_can_not_be_ordered(self):
+        response = self.hold([{"product": self.first.pk, "quantity": 290}], email="hold@test.com", ttl=60)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.stock(self.first), (300, 290))
+
+        order_data = {"email": "other@test.com", "ordered_items": [{"quantity": 11, "product": self.first.pk}]}
+        response = self.client.post(reverse("orders:order-list"), data=json.dumps(order_data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.hold([{"product": self.first.pk, "quantity": 11}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertRaises(DjangoValidationError), transaction.atomic():
+            apply_stock_deltas({self.first.pk: 11})
+        self.assertEqual(self.stock(self.first), (300, 290))
+
+    def test_confirm_turns_the_hold_into_an_order(self):
+        reservation = self.hold([{"product": self.first.pk, "quantity": 2},
+                                 {"product": self.second.pk, "quantity": 1}], email="hold@test.com").data
+
+        response = self.client.post(reverse("orders:reservation-confirm", kwargs={'pk': reservation['id']}))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['email'], "hold@test.com")
+        self.assertEqual(response.data['total_price'], Decimal('964.66'))
+        self.assertEqual(self.stock(self.first), (298, 0))
+        self.assertEqual(self.stock(self.second), (299, 0))
+        self.assertFalse(Reservation.objects.exists())
+
+        response = self.client.post(reverse("orders:reservation-confirm", kwargs={'pk': reservation['id']}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_release_puts_the_stock_back(self):
+        reservation = self.hold([{"product": self.first.pk, "quantity": 5}]).data
+
+        response = self.client.delete(reverse("orders:reservation-detail", kwargs={'pk': reservation['id']}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.stock(self.first), (300, 0))
+        self.assertFalse(ReservedItem.objects.exists())
+
+    def test_expired_reservation_can_not_be_confirmed(self):
+        reservation = self.hold([{"product": self.first.pk, "quantity": 5}], email="late@test.com").data
+        self.expire(reservation['id'])
+
+        response = self.client.post(reverse("orders:reservation-confirm", kwargs={'pk': reservation['id']}))
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertEqual(self.stock(self.first), (300, 0))
+        self.assertFalse(Order.objects.exists())
+
+    def test_sweep_releases_expired_reservations(self):
+        expired = [self.hold([{"product": self.first.pk, "quantity": 1},
+                              {"product": self.second.pk, "quantity": 2}]).data['id'] for _ in range(3)]
+        self.hold([{"product": self.first.pk, "quantity": 4}])
+        for reservation_id in expired:
+            self.expire(reservation_id)
+
+        out = StringIO()
+        call_command('release_expired_reservations', '--batch-size', '2', stdout=out)
+
+        self.assertIn('Released 3 reservations', out.getvalue())
+        self.assertEqual(self.stock(self.first), (300, 4))
+        self.assertEqual(self.stock(self.second), (300, 0))
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    @skipUnless(connection.vendor == 'sqlite', 'the query plan is read in the SQLite format')
+    def test_sweep_reads_the_expiry_index(self):
+        plan = Reservation.objects.filter(expires_at__lte=timezone.now()).order_by('expires_at')[:500].explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+class OrderTotalsTest(APITestCase):
+    """ Test module for the stored order totals """
+
+    def setUp(self):
+        setUpInventory(self)
+        order_data = {"email": "test1@test.com",
+                      "ordered_items": [
+                          {
+                              "quantity": 2,
+                              "product": 1
+                          },
+                          {
+                              "quantity": 1,
+                              "product": 2
+                          }
+                      ]}
+        self.client.post(reverse("orders:order-list"), data=json.dumps(order_data),
+                         content_type='application/json')
+        self.order = Order.objects.get(email="test1@test.com")
+
+    def test_totals_on_create(self):
+        self.assertEqual(self.order.total_price, Decimal('964.66'))
+        self.assertEqual(self.order.item_count, 2)
+
+    def test_price_change_does_not_alter_order(self):
+        Inventory.objects.filter(pk=self.first.pk).update(price=1)
+
+        response = self.client.get(reverse("orders:order-detail", kwargs={'pk': self.order.pk}))
+        self.assertEqual(response.data.get('total_price'), Decimal('964.66'))
+
+    def test_totals_follow_order_items(self):
+        response = self.client.post(
+            reverse("orders:order_item", kwargs={'order_id': self.order.pk}),
+            data=json.dumps({"product": 3, "quantity": 1}), content_type='application/json')
+        self.assertEqual(response.data.get('total_price'), Decimal('1287.88'))
+        self.assertEqual(response.data.get('item_count'), 3)
+
+        ordered_item = self.order.ordered_items.get(product=self.first)
+        response = self.client.delete(
+            reverse("orders:order_item", kwargs={'order_id': self.order.pk}),
+            data=json.dumps({"item_id": ordered_item.pk}), content_type='application/json')
+        self.assertEqual(response.data.get('total_price'), Decimal('645.44'))
+        self.assertEqual(response.data.get('item_count'), 2)
+
+        response = self.client.put(
+            reverse("orders:order-detail", kwargs={'pk': self.order.pk}),
+            data=json.dumps({"ordered_items": [{"quantity": 3, "product": 4}]}),
+            content_type='application/json')
+        self.assertEqual(response.data.get('total_price'), Decimal('972.66'))
+        self.assertEqual(response.data.get('item_count'), 1)
+
+    def test_recompute_order_totals(self):
+        Order.objects.filter(pk=self.order.pk).update(total_price=0, item_count=0)
+
+        with self.assertRaises(CommandError):
+            call_command('recompute_order_totals', '--check', stdout=StringIO())
+
+        version = Order.objects.get(pk=self.order.pk).version
+        out = StringIO()
+        call_command('recompute_order_totals', stdout=out)
+        self.assertIn('fixed 1', out.getvalue())
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.total_price, Decimal('964.66'))
+        self.assertEqual(order.item_count, 2)
+        #the ETags of the wrong totals no longer match
+        self.assertEqual(order.version, version + 1)
+        call_command('recompute_order_totals', '--check', stdout=StringIO())
+
+
+class OrderQueryCountTest(APITestCase):
+    """ Test module for the number of queries of the order endpoints """
+
+    def setUp(self):
+        setUpInventory(self)
+
+    def create_orders(self, count):
+        order_data = {"email": "test1@test.com",
+                      "ordered_items": [
+                          {
+                              "quantity": 1,
+                              "product": 1
+                          },
+                          {
+                              "quantity": 1,
+                              "product": 2
+                          }
+                      ]}
+        for i in range(count):
+            self.client.post(reverse("orders:order-list"), data=json.dumps(order_data),
+                             content_type='application/json')
+
+    def test_list_orders_query_count(self):
+        self.create_orders(2)
+        #orders, items
+        with self.assertNumQueries(2):
+            self.client.get(reverse("orders:order-list"))
+
+        self.create_orders(8)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("orders:order-list"))
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_retrieve_order_query_count(self):
+        self.create_orders(1)
+        order = Order.objects.get()
+        with self.assertNumQueries(2):
+            self.client.get(reverse("orders:order-detail", kwargs={'pk': order.pk}))
+
+    def test_create_order_response_query_count(self):
+        order_data = {"email": "test1@test.com",
+                      "ordered_items": [{"quantity": 1, "product": product.pk}
+                                        for product in (self.first, self.second, self.third)]}
+        #one lookup for all products, savepoint, order and items insert, stock update, low stock check,
+        #sales rollup insert and update, release, then the order and its items joined with their products
+        with self.assertNumQueries(11):
+            response = self.client.post(reverse("orders:order-list"), data=json.dumps(order_data),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+class ExportOrdersTest(APITestCase):
+    """ Test module for streaming the order export """
+
+    def setUp(self):
+        setUpInventory(self)
+        order_data = {"email": "test1@test.com",
+                      "ordered_items": [
+                          {
+                              "quantity": 1,
+                              "product": 1
+                          }
+                      ]}
+        for i in range(3):
+            self.client.post(reverse("orders:order-list"), data=json.dumps(order_data),
+                             content_type='application/json')
+        self.expected = OrderSerializer(Order.objects.order_by('-created_at', 'id'), many=True).data
+
+    def test_export_ndjson(self):
+        response = self.client.get(reverse("orders:order-export"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        content = b''.join(response.streaming_content).decode('utf-8')
+        rows = [json.loads(line, use_decimal=True) for line in content.splitlines()]
+        self.assertEqual(rows, json.loads(json.dumps(self.expected, use_decimal=True), use_decimal=True))
+
+    def test_export_json(self):
+        response = self.client.get(reverse("orders:order-export"), {'type': 'json'})
+
+        content = json.loads(b''.join(response.streaming_content), use_decimal=True)
+        self.assertEqual([order['id'] for order in content['orders']],
+                         [order['id'] for order in self.expected])
+
+    def test_export_created_at_range(self):
+        response = self.client.get(reverse("orders:order-export"), {'created_before': '2000-01-01'})
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        response = self.client.get(reverse("orders:order-export"), {'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_orders_command(self):
+        out = StringIO()
+        call_command('export_orders', '--chunk-size', '2', stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
+
+
+class OrderJSONRendererTest(APITestCase):
+    """ Test module for the order envelope renderer """
+
+    def test_render_list_and_detail(self):
+        renderer = OrderJSONRenderer()
+        order = {'id': 1, 'total_price': Decimal('10.10')}
+
+        self.assertEqual(renderer.render(ReturnList([order], serializer=None)),
+                         b'{"orders":[{"id":1,"total_price":10.10}]}')
+        self.assertEqual(renderer.render(ReturnList([], serializer=None)), b'{"orders":[]}')
+        self.assertEqual(renderer.render(order), b'{"order":{"id":1,"total_price":10.10}}')
+        self.assertEqual(renderer.render({'errors': {'email': ['required']}}),
+                         b'{"errors":{"email":["required"]}}')
+        self.assertEqual(renderer.render(None), b'')
+
+
+@override_settings(REQUEST_METRICS_ENABLED=True)
+class RequestMetricsTest(APITestCase):
+    """ Test module for the request metrics middleware """
+
+    def setUp(self):
+        metrics.registry.reset()
+        setUpInventory(self)
+        Order.create_with_items([{"product": self.first, "quantity": 1}], email="test1@test.com")
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse("orders:order-list"))
+
+        timing = response['Server-Timing']
+        self.assertIn('desc="2 queries"', timing)
+        for phase in ('db;dur=', 'serializer;dur=', 'render;dur=', 'total;dur='):
+            self.assertIn(phase, timing)
+        histogram = metrics.registry.histograms[('request_serializer_seconds', 'orders:order-list', 'GET')]
+        self.assertGreater(histogram.sum, 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("orders:order-list"))
+        self.client.get(reverse("orders:order-list"))
+
+        response = self.client.get(reverse("metrics"))
+        content = response.content.decode('utf-8')
+        self.assertIn('request_queries_count{view="orders:order-list",method="GET"} 2', content)
+        self.assertIn('request_queries_bucket{view="orders:order-list",method="GET",le="2"} 2', content)
+        self.assertIn('# TYPE request_render_seconds histogram', content)
+        self.assertIn('request_serializer_seconds_count{view="orders:order-list",method="GET"} 2', content)
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("orders:order-list"))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class ValidateOrderedItemsTest(APITestCase):
+    """ Test module for validating all lines of an order together """
+
+    def setUp(self):
+        caches['default'].clear()
+        setUpInventory(self)
+
+    def test_per_line_errors(self):
+        Inventory.objects.filter(pk=self.fourth.pk).update(status=False)
+        order_data = {"email": "test1@test.com",
+                      "ordered_items": [
+                          {"quantity": 1, "product": self.first.pk},
+                          {"quantity": 2, "product": self.first.pk},
+                          {"quantity": 301, "product": self.second.pk},
+                          {"quantity": 1, "product": 1000},
+                          {"quantity": 1, "product": self.fourth.pk},
+                      ]}
+        response = self.client.post(reverse("orders:order-list"), data=json.dumps(order_data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        errors = response.data['errors']['ordered_items']
+        self.assertEqual(errors[0], {})
+        self.assertIn("item exists already", str(errors[1]['product']))
+        self.assertIn("Out of stock", str(errors[2]['quantity']))
+        self.assertIn("does not exist", str(errors[3]['product']))
+        self.assertIn("not active", str(errors[4]['product']))
+        self.assertFalse(Order.objects.exists())
+
+    def test_validation_queries_do_not_grow_with_lines(self):
+        products = Inventory.objects.bulk_create([
+            Inventory(name='line_product{0}'.format(i), slug='line-product{0}'.format(i),
+                      description="line", price=1, quantity=5)
+            for i in range(50)])
+        order_data = {"email": "test1@test.com",
+                      "ordered_items": [{"quantity": 1, "product": product_id}
+                                        for product_id in Inventory.objects.values_list('id', flat=True)]}
+        serializer = OrderSerializer(data=order_data)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+    def test_update_can_keep_held_stock(self):
+        order = Order.create_with_items([{"product": self.first, "quantity": 300}], email="test1@test.com")
+
+        serializer = OrderSerializer(order, data={"ordered_items": [{"quantity": 300, "product": self.first.pk}]},
+                                     partial=True)
+        self.assertTrue(serializer.is_valid())
+
+    def test_quantity_must_be_positive(self):
+        serializer = OrderSerializer(data={"email": "test1@test.com",
+                                           "ordered_items": [{"quantity": -1, "product": self.first.pk}]})
+        self.assertFalse(serializer.is_valid())
+
+
+class IdempotentOrderTest(APITestCase):
+    """ Test module for replaying orders submitted with an Idempotency-Key """
+
+    def setUp(self):
+        caches['default'].clear()
+        setUpInventory(self)
+        self.order_data = {"email": "test1@test.com",
+                           "ordered_items": [{"quantity": 2, "product": self.first.pk}]}
+
+    def post(self, data, key='retry-1'):
+        return self.client.post(reverse("orders:order-list"), data=json.dumps(data),
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def assert_replayed(self, first, num_queries):
+        with self.assertNumQueries(num_queries):
+            replay = self.post(self.order_data)
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.content, first.content)
+        self.assertEqual(replay['ETag'], first['ETag'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 298)
+
+    def test_replay_from_cache(self):
+        first = self.post(self.order_data)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assert_replayed(first, 0)
+
+    @override_settings(IDEMPOTENCY_CACHE_ALIAS=None)
+    def test_replay_from_table(self):
+        first = self.post(self.order_data)
+        #the stored key only
+        self.assert_replayed(first, 1)
+
+    def test_key_reused_for_another_request(self):
+        self.post(self.order_data)
+        response = self.post({"email": "other@test.com", "ordered_items": [{"quantity": 1, "product": self.second.pk}]})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_failed_request_is_not_stored(self):
+        response = self.post({"email": "test1@test.com", "ordered_items": [{"quantity": 301, "product": self.first.pk}]})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.assertEqual(self.post(self.order_data).status_code, status.HTTP_201_CREATED)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.post(self.order_data, key='')
+        self.post(self.order_data, key='')
+        self.assertEqual(Order.objects.count(), 2)
+
+    @override_settings(IDEMPOTENCY_CACHE_ALIAS=None)
+    def test_expired_key_is_used_again(self):
+        self.post(self.order_data)
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(self.post(self.order_data).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_purge_idempotency_keys(self):
+        self.post(self.order_data, key='old')
+        self.post(self.order_data, key='new')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=2))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class ConcurrentIdempotentOrderTest(TransactionTestCase):
+    """ Test module for duplicate submissions racing each other """
+
+    def setUp(self):
+        caches['default'].clear()
+        setUpInventory(self)
+
+    def create_order(self):
+        serializer = OrderSerializer(data={"email": "test1@test.com",
+                                           "ordered_items": [{"quantity": 1, "product": self.first.pk}]})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def submit(self, responses):
+        try:
+            while True:
+                try:
+                    responses.append(idempotency.run_once('racing', {"email": "test1@test.com"}, self.create_order))
+                    return
+                except OperationalError:
+                    # sqlite reports "table is locked" instead of waiting, retry
+                    time.sleep(0.001)
+        finally:
+            connection.close()
+
+    def test_concurrent_duplicates_create_one_order(self):
+        responses = []
+        threads = [threading.Thread(target=self.submit, args=(responses,)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([response.status_code for response in responses], [status.HTTP_201_CREATED] * 10)
+        self.assertEqual(len({json.dumps(response.data) for response in responses}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Inventory.objects.get(pk=self.first.pk).quantity, 299)
+
+
+class AsgiReadTest(TransactionTestCase):
+    """ Test module for serving the read endpoints through the pooled ASGI handler """
+
+    def setUp(self):
+        caches['default'].clear()
+        setUpInventory(self)
+        self.order = Order.create_with_items([{"product": self.first, "quantity": 1}], email="test1@test.com")
+        self.handler = PooledASGIHandler()
+
+    async def get(self, path, query_string=b''):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query_string,
+                 'headers': [(b'host', b'testserver')]}
+        await self.handler(scope, receive, send)
+        return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+    def test_concurrent_reads(self):
+        paths = [reverse("orders:order-list"),
+                 reverse("orders:order-detail", kwargs={'pk': self.order.pk}),
+                 reverse("inventories:inventories-list"),
+                 reverse("inventories:inventories-detail", kwargs={'slug': self.first.slug})]
+
+        async def read_all():
+            return await asyncio.gather(*[self.get(path) for path in paths * 10])
+
+        responses = asyncio.run(read_all())
+        connection.close()
+
+        self.assertEqual({status_code for status_code, body in responses}, {status.HTTP_200_OK})
+        self.assertEqual(json.loads(responses[1][1])['order']['id'], self.order.pk)
+        self.assertEqual(json.loads(responses[3][1])['inventory']['slug'], self.first.slug)
+
+    def test_streaming_export(self):
+        status_code, body = asyncio.run(self.get(reverse("orders:order-export")))
+
+        self.assertEqual(status_code, status.HTTP_200_OK)
+        self.assertEqual([json.loads(line)['id'] for line in body.decode('utf-8').splitlines()], [self.order.pk])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'the query plans are read in the SQLite format')
+class OrderIndexesTest(APITestCase):
+    """ Test module for the indexes and constraints used by the hot order queries """
+
+    def setUp(self):
+        setUpInventory(self)
+        self.order = Order.create_with_items([{"product": self.first, "quantity": 1}], email="test1@test.com")
+
+    def assertUsesIndex(self, queryset, expected):
+        plan = queryset.explain()
+        self.assertIn(expected, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_list_page_uses_created_id_index(self):
+        self.assertUsesIndex(Order.objects.order_by('-created_at', 'id')[:21], 'USING INDEX order_created_id_idx')
+
+    def test_customer_orders_use_email_created_index(self):
+        self.assertUsesIndex(Order.objects.filter(email="test1@test.com").order_by('-created_at', 'id')[:21],
+                             'USING INDEX order_email_created_idx (email=?)')
+
+    def test_item_lookups_use_order_product_constraint(self):
+        self.assertUsesIndex(OrderedItem.objects.filter(order=self.order, product=self.first),
+                             '(order_id=? AND product_id=?)')
+        self.assertUsesIndex(OrderedItem.objects.filter(order_id__in=[self.order.pk]), '(order_id=?)')
+
+    def test_same_product_twice_is_rejected(self):
+        with self.assertRaises(IntegrityError):
+            OrderedItem.objects.create(order=self.order, product=self.first, quantity=1, unit_price=1)
+
+    def test_quantity_must_be_positive(self):
+        with self.assertRaises(IntegrityError):
+            OrderedItem.objects.create(order=self.order, product=self.second, quantity=0, unit_price=1)
+
+
+class CustomerOrdersTest(APITestCase):
+    """ Test module for filtering orders and summarizing them per customer """
+
+    def setUp(self):
+        setUpInventory(self)
+        self.orders = [
+            Order.create_with_items([{"product": self.first, "quantity": 1}], email="alice@test.com"),
+            Order.create_with_items([{"product": self.second, "quantity": 2}], email="alice@test.com"),
+            Order.create_with_items([{"product": self.third, "quantity": 1}], email="bob@test.com"),
+        ]
+        Order.objects.filter(pk=self.orders[0].pk).update(created_at=timezone.now() - timedelta(days=30))
+        Order.objects.filter(pk=self.orders[1].pk).update(status=False)
+
+    def list_ids(self, params):
+        response = self.client.get(reverse("orders:order-list"), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(order['id'] for order in response.data['results'])
+
+    def test_filter_orders(self):
+        self.assertEqual(self.list_ids({'email': 'alice@test.com'}), [self.orders[0].pk, self.orders[1].pk])
+        self.assertEqual(self.list_ids({'email': 'alice@test.com', 'status': 'true'}), [self.orders[0].pk])
+        self.assertEqual(self.list_ids({'status': 'false'}), [self.orders[1].pk])
+        created_after = (timezone.now() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.list_ids({'created_after': created_after}), [self.orders[1].pk, self.orders[2].pk])
+
+    def test_filter_by_day(self):
+        today = timezone.localdate().isoformat()
+        self.assertEqual(self.list_ids({'created_after': today}), [self.orders[1].pk, self.orders[2].pk])
+        self.assertEqual(self.list_ids({'created_before': today}), [order.pk for order in self.orders])
+        self.assertEqual(self.list_ids({'created_after': today, 'created_before': today}),
+                         [self.orders[1].pk, self.orders[2].pk])
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse("orders:order-list"), {'status': 'maybe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_customer_summary(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("orders:customer_summary", kwargs={'email': 'alice@test.com'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['order_count'], 2)
+        self.assertEqual(response.data['lifetime_spend'], Decimal('965.66'))
+        self.assertEqual(parse_datetime(response.data['last_order_at']), Order.objects.get(pk=self.orders[1].pk).created_at)
+        self.assertEqual(json.loads(response.content)['customer']['email'], 'alice@test.com')
+
+        response = self.client.get(reverse("orders:customer_summary", kwargs={'email': 'alice@test.com'}),
+                                   {'status': 'true'})
+        self.assertEqual(response.data['order_count'], 1)
+
+    def test_unknown_customer_summary(self):
+        response = self.client.get(reverse("orders:customer_summary", kwargs={'email': 'nobody@test.com'}))
+        self.assertEqual(response.data['order_count'], 0)
+        self.assertEqual(response.data['lifetime_spend'], Decimal('0'))
+        self.assertIsNone(response.data['last_order_at'])
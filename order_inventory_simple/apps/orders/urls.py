@@ -2,15 +2,18 @@ from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
 
-from .views import OrderViewSet, OrderItemAPIView
+from .views import CustomerSummaryAPIView, OrderViewSet, OrderItemAPIView, ReservationViewSet
 
 
 router = DefaultRouter(trailing_slash=False)
 
 router.register(r'orders', OrderViewSet)
+router.register(r'reservations', ReservationViewSet)
 
 app_name = 'orders'
 urlpatterns = [path('', include(router.urls)),
                path('orders/<int:order_id>/order_item',
                     OrderItemAPIView.as_view(), name="order_item"),
+               path('customers/<str:email>/summary',
+                    CustomerSummaryAPIView.as_view(), name="customer_summary"),
                ]
@@ -1,38 +1,150 @@
+from collections import OrderedDict
+
 from django.shortcuts import render
 
 from rest_framework import serializers, status, generics, mixins, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.exceptions import APIException, NotFound, ValidationError
 from rest_framework.views import APIView
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
-from .models import Order, OrderedItem
-from . import models
+from ..core import conditional, metrics
+from ..core.exceptions import PreconditionFailed
+from ..core.fast import FastReadViewMixin
+from ..core.metrics import MetricsViewMixin
+from ..core.models import VersionConflict
+from ..core.pagination import TimeStampCursorPagination
+from ..core.sparse import ExpandViewMixin, SparseFieldsViewMixin
+from ..core.views import StreamingExportMixin
+from .models import Order, OrderedItem, Reservation
+from . import idempotency, models
+from ..inventories import cache
 from ..inventories.models import Inventory
 from ..inventories.serializers import InventorySerializer
-from .serializers import OrderSerializer, OrderDetailedSerializer, OrderedItemCreateSerializer
-from .renderers import OrderJSONRenderer
+from .filters import filter_orders
+from .serializers import (CustomerSummarySerializer, OrderSerializer, OrderDetailedSerializer,
+                          OrderedItemCreateSerializer, OrderedItemDetailedSerializer, OrderItemChangesSerializer,
+                          ReservationSerializer)
+from .renderers import CustomerJSONRenderer, OrderJSONRenderer, ReservationJSONRenderer
+
 
+class OrderViewSet(MetricsViewMixin, SparseFieldsViewMixin, ExpandViewMixin, FastReadViewMixin, StreamingExportMixin, mixins.CreateModelMixin, mixins.ListModelMixin,   mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """Orders, the list and retrieve take `?fields=` and `?expand=`.
 
-class OrderViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,   mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    `expand=product` nests the products in the items, `expand=products`
+    sends each product of the orders once in a `products` map by id, its
+    fields selected with `fields=products.<field>`.
+    """
     lookup_field = 'pk'
     queryset = Order.objects.all()
+    pagination_class = TimeStampCursorPagination
     renderer_classes = (OrderJSONRenderer,)
     serializer_class = OrderSerializer
     read_serializer_class = OrderDetailedSerializer
+    export_serializer_class = OrderSerializer
+    export_prefetch = ('ordered_items',)
+    side_maps = ('products',)
+    expandable = ('product', 'products')
+
+    def filter_queryset(self, queryset):
+        if self.action != 'list':
+            return super().filter_queryset(queryset)
+        try:
+            return filter_orders(super().filter_queryset(queryset), self.request.query_params)
+        except ValueError as e:
+            raise ValidationError(str(e))
+
+    def get_serializer_class(self):
+        if self.action in ('list', 'retrieve') and 'product' in self.expansion():
+            return self.read_serializer_class
+        return self.serializer_class
+
+    def get_queryset(self):
+        # items are fetched with one query for the whole page, products only when they are nested
+        if self.action == 'list':
+            items = self.items_prefetch()
+            queryset = self.only_selected(self.queryset)
+            return queryset.prefetch_related(items) if items is not None else queryset
+        if self.action == 'retrieve':
+            return self.only_selected(self.queryset, extra=self.always_columns + ('version',))
+        if self.action == 'create':
+            return self.queryset.prefetch_related(Prefetch(
+                'ordered_items', queryset=OrderedItem.objects.select_related('product')))
+        return self.queryset
+
+    def items_prefetch(self):
+        """The prefetch of the items reading the selected columns, None when no item is needed."""
+        fields = self.field_selection()
+        item_fields = fields.get('ordered_items', None) if fields else None
+        if fields and item_fields is None:
+            if 'products' not in self.expansion():
+                return None
+            item_fields = {'product': {}}
+
+        queryset = OrderedItem.objects.all()
+        item_serializer_class = OrderedItemCreateSerializer
+        if 'product' in self.expansion():
+            item_serializer_class = OrderedItemDetailedSerializer
+            if not item_fields or 'product' in item_fields:
+                queryset = queryset.select_related('product')
+        # the side-map is built from the product ids of the items
+        extra = ('order', 'product') if 'products' in self.expansion() else ('order',)
+        queryset = self.only_selected(queryset, item_serializer_class, item_fields, extra=extra)
+        return Prefetch('ordered_items', queryset=queryset)
+
+    def products_side_map(self, orders):
+        """`{product id: product}` for the products of the items of `orders`, each one once."""
+        product_ids = {item.product_id for order in orders for item in order.ordered_items.all()}
+        fields = self.side_map_selection('products')
+        products = list(self.only_selected(Inventory.objects.filter(pk__in=product_ids).order_by('id'),
+                                           InventorySerializer, fields, extra=()))
+        data = self.fast_data(products, many=True, serializer_class=InventorySerializer, selected_fields=fields or {})
+        return OrderedDict((str(product.pk), row) for product, row in zip(products, data))
+
+    def list(self, request):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        response = self.get_paginated_response(self.fast_data(page, many=True))
+        if 'products' in self.expansion():
+            response.data['products'] = self.products_side_map(page)
+        return response
 
     def create(self, request):
+        key = request.headers.get(idempotency.HEADER)
+        if key:
+            # a retried submission gets the stored response instead of a second order
+            return idempotency.run_once(key, request.data, lambda: self.create_order(request))
+        return self.create_order(request)
+
+    def create_order(self, request):
         try:
             serializer_context = {'request': request, "create": True}
             write_serializer = self.serializer_class(data=request.data, context=serializer_context)
 
             write_serializer.is_valid(raise_exception=True)
             write_serializer.save()
-            read_serializer = self.read_serializer_class(write_serializer.instance, context=serializer_context)
+            instance = self.get_queryset().get(pk=write_serializer.instance.pk)
+            read_serializer = self.read_serializer_class(instance, context=serializer_context)
         except Exception as e:
             a= type(e)
             raise e
-        return Response(read_serializer.data, status=status.HTTP_201_CREATED)
+        response = Response(metrics.serialized(read_serializer), status=status.HTTP_201_CREATED)
+        return conditional.set_etag(response, instance)
+
+    def retrieve(self, request, pk):
+        instance = self.get_object()
+        # a client holding the current version gets a 304 before the items are read
+        response = conditional.not_modified(request, instance)
+        if response is not None:
+            return response
+        items = self.items_prefetch()
+        if items is not None:
+            prefetch_related_objects([instance], items)
+        data = self.fast_data(instance)
+        if 'products' in self.expansion():
+            data['products'] = self.products_side_map([instance])
+        return conditional.set_etag(Response(data), instance)
 
 
     def update(self, request, pk):
@@ -44,57 +156,162 @@ class OrderViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,   mixins.Retr
         serializer_context = {'request': request, "update": True}
         
         
+        expected_version = conditional.expected_version(request, serializer_instance)
         serializer = self.serializer_class(
             serializer_instance, data=request.data, context=serializer_context, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        serializer_instance.expected_version = expected_version
+        try:
+            serializer.save()
+        except VersionConflict:
+            raise PreconditionFailed()
+
+        response = Response(metrics.serialized(serializer), status=status.HTTP_200_OK)
+        return conditional.set_etag(response, serializer_instance)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def partial_update(self, request, pk):
+        return self.update(request, pk)
 
     def destroy(self, request, pk):
         try:
             serializer_instance = self.queryset.get(pk=pk)
         except Order.DoesNotExist:
             raise NotFound("Not found an order with this order id")
-        serializer_instance.ordered_items.all().delete() #trigger the pre_delete to update the inventory
-        serializer_instance.delete()
-  
+        #put the stock of the ordered items back, a concurrent delete may have come first
+        if not serializer_instance.release():
+            raise NotFound("Not found an order with this order id")
+
         return Response(None, status=status.HTTP_204_NO_CONTENT)
 
 
-class OrderItemAPIView(APIView):
+class OrderItemAPIView(MetricsViewMixin, APIView):
+    """Add, change and remove the items of an order.
+
+    POST adds one item (`{"product", "quantity"}`) or a list of them, DELETE
+    removes one item (`{"item_id"}`) or a list of them or of item ids, PATCH changes the
+    quantity of one item (`{"item_id", "quantity"}`) or of a list of them.
+    PATCH also takes `{"add": [...], "change": [...], "remove": [item ids]}`
+    to mix them. All the changes of a request are applied in one transaction
+    with one stock update, and the order is returned once. An If-Match
+    header makes the changes conditional on the version of the order.
+    """
     serializer_class = OrderSerializer
+    changes_serializer_class = OrderItemChangesSerializer
 
     def delete(self, request,  order_id=None):
-        serializer_context = {'request': request}
+        lines = request.data if isinstance(request.data, list) else [request.data]
+        removed = [line.get('item_id', None) if isinstance(line, dict) else line for line in lines]
+        removed = [item_id for item_id in removed if item_id is not None]
+        return self.apply_changes(request, order_id, {'remove': removed}, status.HTTP_200_OK)
 
+    def post(self, request, order_id=None):
+        added = request.data if isinstance(request.data, list) else [request.data]
+        return self.apply_changes(request, order_id, {'add': added}, status.HTTP_201_CREATED)
+
+    def patch(self, request, order_id=None):
+        changes = request.data
+        if isinstance(changes, list) or not any(kind in changes for kind in ('add', 'change', 'remove')):
+            changes = {'change': changes if isinstance(changes, list) else [changes]}
+        return self.apply_changes(request, order_id, changes, status.HTTP_200_OK)
+
+    def apply_changes(self, request, order_id, changes, status_code):
         try:
             order = Order.objects.get(id=order_id)
         except Order.DoesNotExist:
             raise NotFound("Not found an order with this order id")
-        except OrderedItem.DoesNotExist:
-            raise NotFound("Not found an order item with this ordered item id")
 
-        order.remove_order_item(request.data.get('item_id', None))
+        changes_serializer = self.changes_serializer_class(data=changes)
+        changes_serializer.is_valid(raise_exception=True)
+        changes = changes_serializer.validated_data
 
-        serializer = self.serializer_class(order, context=serializer_context)
+        order.expected_version = conditional.expected_version(request, order)
+        added = changes.get('add', [])
+        products = cache.get_many_by_id([order_item['product'] for order_item in added])
+        for order_item in added:
+            if order_item['product'] not in products:
+                raise NotFound("Not found a product with this product id")
+            order_item['product'] = products[order_item['product']]
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            order.change_order_items(
+                added, {line['item_id']: line['quantity'] for line in changes.get('change', [])},
+                changes.get('remove', []))
+        except VersionConflict:
+            raise PreconditionFailed()
+        serializer = self.serializer_class(order, context={'request': request})
+
+        return conditional.set_etag(Response(metrics.serialized(serializer), status=status_code), order)
 
-    def post(self, request, order_id=None):
-        serializer_context = {'request': request}
 
+class ReservationExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'The reservation expired, its items are no longer held.'
+    default_code = 'reservation_expired'
+
+
+class ReservationViewSet(MetricsViewMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Stock held for a checkout.
+
+    POST holds `items` for `ttl` seconds, POST `<id>/confirm` turns them into
+    an order and DELETE releases them. Expired reservations are released by
+    `release_expired_reservations`, or when they are confirmed too late.
+    """
+    lookup_field = 'pk'
+    queryset = Reservation.objects.prefetch_related('reserved_items')
+    renderer_classes = (ReservationJSONRenderer,)
+    serializer_class = ReservationSerializer
+
+    def create(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        return Response(metrics.serialized(serializer), status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk):
+        self.get_object().release()
+
+        return Response(None, status=status.HTTP_204_NO_CONTENT)
+
+    @action(detail=True, methods=['post'], renderer_classes=(OrderJSONRenderer,))
+    def confirm(self, request, pk=None):
+        reservation = self.get_object()
+        if reservation.expired:
+            reservation.release()
+            raise ReservationExpired()
+        email = request.data.get('email', None) or reservation.email
+        if not email:
+            raise ValidationError({'email': ["An order needs an email"]})
+
+        order = reservation.confirm(email=email)
+        if order is None:
+            # confirmed, released or swept since it was read
+            raise NotFound("Not found a reservation with this id")
+        instance = Order.objects.prefetch_related(Prefetch(
+            'ordered_items', queryset=OrderedItem.objects.select_related('product'))).get(pk=order.pk)
+        serializer = OrderDetailedSerializer(instance, context={'request': request})
+
+        response = Response(metrics.serialized(serializer), status=status.HTTP_201_CREATED)
+        return conditional.set_etag(response, instance)
+
+
+class CustomerSummaryAPIView(MetricsViewMixin, APIView):
+    """Order count, lifetime spend and last order date of the orders placed with an email.
+
+    Takes the same `status`, `created_after` and `created_before` parameters
+    as the order list.
+    """
+    renderer_classes = (CustomerJSONRenderer,)
+    serializer_class = CustomerSummarySerializer
+
+    def get(self, request, email=None):
+        params = request.query_params.copy()
+        params.pop('email', None)
         try:
-            order = Order.objects.get(id=order_id)
-            product = Inventory.objects.get(id=request.data.get('product', None))
-            request.data['product' ]= product
-        except Order.DoesNotExist:
-            raise NotFound("Not found an order with this order id")
-        except Inventory.DoesNotExist:
-            raise NotFound("Not found a product with this product id")
-           
-        order.add_order_item(request.data)
-        serializer = self.serializer_class(order, context=serializer_context)
+            queryset = filter_orders(Order.objects.all(), params)
+        except ValueError as e:
+            raise ValidationError(str(e))
 
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        serializer = self.serializer_class(Order.customer_summary(email, queryset))
+        return Response(metrics.serialized(serializer), status=status.HTTP_200_OK)
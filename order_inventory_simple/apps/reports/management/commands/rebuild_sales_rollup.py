@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ....orders.models import OrderedItem
+from ...models import ProductSalesRollup
+from ...rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Compute the product sales rollup again from the ordered items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            ProductSalesRollup.objects.all().delete()
+            inserted = rebuild_rollup(OrderedItem, ProductSalesRollup, batch_size=options['batch_size'])
+        self.stdout.write('Rebuilt {0} rollup rows'.format(inserted))
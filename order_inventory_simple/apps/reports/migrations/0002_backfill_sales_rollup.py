@@ -0,0 +1,19 @@
+from django.db import migrations
+
+from ..rollup import rebuild_rollup
+
+
+def backfill(apps, schema_editor):
+    rebuild_rollup(apps.get_model('orders', 'OrderedItem'), apps.get_model('reports', 'ProductSalesRollup'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        ('orders', '0006_ordereditem_constraints'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class ProductSalesRollup(models.Model):
+    """Sales of a product in the orders created during one hour.
+
+    Kept up to date by the order methods in the transaction that changes the
+    items; the reports read only this table.
+    """
+    #indexed by the (product, period_start) constraint
+    product = models.ForeignKey(
+        'inventories.Inventory', related_name='sales_rollups', on_delete=models.CASCADE, db_index=False)
+    period_start = models.DateTimeField()
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'period_start'], name='salesrollup_product_period_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['period_start'], name='salesrollup_period_idx'),
+        ]
+
+    def __str__(self):
+        return '{0} {1}'.format(self.product_id, self.period_start.isoformat())
@@ -0,0 +1,13 @@
+from ..core.renderers import OrderInventoryJSONRenderer
+
+
+class ProductSalesJSONRenderer(OrderInventoryJSONRenderer):
+
+    label = 'product'
+    label_plural = 'products'
+
+
+class SalesJSONRenderer(OrderInventoryJSONRenderer):
+
+    label = 'sale'
+    label_plural = 'sales'
@@ -0,0 +1,98 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db.models import Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, Sum, When
+from django.db.models.functions import TruncHour
+
+from .models import ProductSalesRollup
+
+#keep the number of sql parameters of one rollup update well below backend limits
+ROLLUP_BATCH_SIZE = 200
+
+
+def period_of(moment):
+    """Start of the hour `moment` falls in."""
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _empty_sales():
+    return [0, 0, 0]
+
+
+def collect_sales(items, sign=1):
+    """Sum units, revenue and lines of ordered items per product.
+
+    `items` are OrderedItem instances; each line counts as one order since a
+    product is ordered once per order.
+    """
+    sales = defaultdict(_empty_sales)
+    for item in items:
+        line = sales[item.product_id]
+        line[0] += sign * item.quantity
+        line[1] += sign * item.total_price
+        line[2] += sign
+    return sales
+
+
+def merge_sales(*sales_list):
+    merged = defaultdict(_empty_sales)
+    for sales in sales_list:
+        for product_id, (units, revenue, orders) in sales.items():
+            line = merged[product_id]
+            line[0] += units
+            line[1] += revenue
+            line[2] += orders
+    return merged
+
+
+def record_sales(created_at, sales):
+    """Add `sales` of an order created at `created_at` to the rollup of its hour.
+
+    The missing rows are inserted first, skipping the existing ones, then all
+    products are changed by one UPDATE of increments (one per
+    `ROLLUP_BATCH_SIZE` products), so concurrent orders never lose a sale.
+    Run it in the transaction changing the items.
+    """
+    period = period_of(created_at)
+    product_ids = sorted(product_id for product_id, line in sales.items() if any(line))
+    for start in range(0, len(product_ids), ROLLUP_BATCH_SIZE):
+        batch = product_ids[start:start + ROLLUP_BATCH_SIZE]
+        ProductSalesRollup.objects.bulk_create(
+            [ProductSalesRollup(product_id=product_id, period_start=period) for product_id in batch],
+            ignore_conflicts=True)
+        ProductSalesRollup.objects.filter(period_start=period, product_id__in=batch).update(
+            units_sold=_increments('units_sold', batch, sales, 0, IntegerField()),
+            revenue=_increments('revenue', batch, sales, 1, DecimalField(max_digits=14, decimal_places=2)),
+            order_count=_increments('order_count', batch, sales, 2, IntegerField()))
+
+
+def _increments(field, product_ids, sales, index, output_field):
+    return Case(*[When(product_id=product_id, then=F(field) + sales[product_id][index])
+                  for product_id in product_ids],
+                default=F(field), output_field=output_field)
+
+
+def rebuild_rollup(ordered_item_model, rollup_model, batch_size=1000):
+    """Insert the rollup rows of every ordered item, grouped by product and hour, returns how many.
+
+    The models are passed in so migrations can give their historical ones.
+    The grouped rows are streamed and inserted `batch_size` at a time, the
+    rollup is expected to be empty.
+    """
+    line_price = ExpressionWrapper(F('quantity') * F('unit_price'),
+                                   output_field=DecimalField(max_digits=14, decimal_places=2))
+    rows = (ordered_item_model.objects
+            .annotate(period=TruncHour('order__created_at'))
+            .values('product_id', 'period')
+            .annotate(units=Sum('quantity'), line_revenue=Sum(line_price), orders=Count('id'))
+            .order_by()
+            .iterator(chunk_size=batch_size))
+    rollups = (rollup_model(product_id=row['product_id'], period_start=row['period'], units_sold=row['units'],
+                            revenue=row['line_revenue'], order_count=row['orders']) for row in rows)
+    inserted = 0
+    while True:
+        chunk = list(islice(rollups, batch_size))
+        if not chunk:
+            return inserted
+        rollup_model.objects.bulk_create(chunk)
+        inserted += len(chunk)
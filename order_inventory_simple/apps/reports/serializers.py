@@ -0,0 +1,17 @@
+from rest_framework import serializers
+
+
+class TopProductSerializer(serializers.Serializer):
+    product = serializers.IntegerField(source='product_id')
+    name = serializers.CharField(source='product__name')
+    slug = serializers.CharField(source='product__slug')
+    units_sold = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, coerce_to_string=False)
+    order_count = serializers.IntegerField()
+
+
+class SalesPeriodSerializer(serializers.Serializer):
+    period = serializers.DateTimeField()
+    units_sold = serializers.IntegerField()
+    revenue = serializers.DecimalField(max_digits=14, decimal_places=2, coerce_to_string=False)
+    order_count = serializers.IntegerField()
@@ -0,0 +1,135 @@
+import simplejson as json
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework.views import status
+
+from ..inventories.models import Inventory
+from ..orders.models import Order
+from ..orders.serializers import OrderSerializer
+from .models import ProductSalesRollup
+from .rollup import period_of
+
+
+class SalesRollupTest(APITestCase):
+    """ Test module for keeping the sales rollup up to date with the orders """
+
+    def setUp(self):
+        self.first = Inventory.objects.create(
+            name='rollup_product1', description="rollup", price=Decimal('2.50'), quantity=100)
+        self.second = Inventory.objects.create(
+            name='rollup_product2', description="rollup", price=Decimal('10.00'), quantity=100)
+        self.third = Inventory.objects.create(
+            name='rollup_product3', description="rollup", price=Decimal('1.00'), quantity=100)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.third.refresh_from_db()
+
+    def rollups(self):
+        return sorted(ProductSalesRollup.objects.values_list(
+            'product_id', 'period_start', 'units_sold', 'revenue', 'order_count'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.rollups()
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        #rows whose sales went back to zero are kept by the incremental updates only
+        self.assertEqual([row for row in incremental if any(row[2:])], self.rollups())
+
+    def test_create_order(self):
+        order = Order.create_with_items([{"product": self.first, "quantity": 4},
+                                         {"product": self.second, "quantity": 1}], email="rollup@test.com")
+        period = period_of(order.created_at)
+
+        self.assertEqual(self.rollups(), sorted([(self.first.pk, period, 4, Decimal('10.00'), 1),
+                                                 (self.second.pk, period, 1, Decimal('10.00'), 1)]))
+
+    def test_update_and_delete_orders(self):
+        first_order = Order.create_with_items([{"product": self.first, "quantity": 4},
+                                               {"product": self.second, "quantity": 1}], email="rollup@test.com")
+        second_order = Order.create_with_items([{"product": self.first, "quantity": 1}], email="rollup@test.com")
+
+        serializer = OrderSerializer(first_order, partial=True, data={"ordered_items": [
+            {"product": self.first.pk, "quantity": 2}, {"product": self.third.pk, "quantity": 5}]})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertMatchesRebuild()
+
+        second_order.add_order_item({"product": self.second, "quantity": 3})
+        second_order.remove_order_item(second_order.ordered_items.get(product=self.first).pk)
+        self.assertMatchesRebuild()
+
+        Order.objects.get(pk=first_order.pk).release()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.rollups(), [(self.second.pk, period_of(second_order.created_at), 3, Decimal('30.00'), 1)])
+
+    def test_rebuild_in_batches(self):
+        Order.create_with_items([{"product": self.first, "quantity": 4},
+                                 {"product": self.second, "quantity": 1}], email="rollup@test.com")
+        Order.create_with_items([{"product": self.third, "quantity": 2}], email="rollup@test.com")
+        incremental = self.rollups()
+
+        out = StringIO()
+        # savepoint, delete, select, one insert per row, release
+        with self.assertNumQueries(7):
+            call_command('rebuild_sales_rollup', '--batch-size', '1', stdout=out)
+        self.assertIn('Rebuilt 3 rollup rows', out.getvalue())
+        self.assertEqual(incremental, self.rollups())
+
+
+class ReportsTest(APITestCase):
+    """ Test module for the reports read from the sales rollup """
+
+    def setUp(self):
+        self.first = Inventory.objects.create(
+            name='report_product1', description="report", price=Decimal('2.50'), quantity=100)
+        self.second = Inventory.objects.create(
+            name='report_product2', description="report", price=Decimal('10.00'), quantity=100)
+        self.period = datetime(2020, 1, 29, 12, tzinfo=timezone.utc)
+        ProductSalesRollup.objects.bulk_create([
+            ProductSalesRollup(product=self.first, period_start=self.period, units_sold=10,
+                               revenue=Decimal('25.00'), order_count=4),
+            ProductSalesRollup(product=self.first, period_start=self.period - timedelta(hours=1),
+                               units_sold=2, revenue=Decimal('5.00'), order_count=2),
+            ProductSalesRollup(product=self.second, period_start=self.period, units_sold=3,
+                               revenue=Decimal('30.00'), order_count=3),
+            ProductSalesRollup(product=self.second, period_start=self.period - timedelta(days=3),
+                               units_sold=1, revenue=Decimal('10.00'), order_count=1),
+        ])
+
+    def test_top_products(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("reports:top_products"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([(row['product'], row['units_sold']) for row in response.data],
+                         [(self.first.pk, 12), (self.second.pk, 4)])
+        self.assertEqual(json.loads(response.content)['products'][0]['slug'], self.first.slug)
+
+        response = self.client.get(reverse("reports:top_products"), {'by': 'revenue', 'limit': 1})
+        self.assertEqual([(row['product'], row['revenue']) for row in response.data],
+                         [(self.second.pk, Decimal('40.00'))])
+
+        response = self.client.get(reverse("reports:top_products"), {'by': 'orders', 'created_after': '2020-01-28T00:00:00Z'})
+        self.assertEqual([(row['product'], row['order_count']) for row in response.data],
+                         [(self.first.pk, 6), (self.second.pk, 3)])
+
+    def test_sales(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("reports:sales"), {'interval': 'hour', 'product': self.first.pk})
+        self.assertEqual([(row['units_sold'], row['order_count']) for row in response.data], [(2, 2), (10, 4)])
+
+        response = self.client.get(reverse("reports:sales"))
+        self.assertEqual(json.loads(response.content)['sales'], [
+            {'period': '2020-01-26T00:00:00Z', 'units_sold': 1, 'revenue': 10.0, 'order_count': 1},
+            {'period': '2020-01-29T00:00:00Z', 'units_sold': 15, 'revenue': 60.0, 'order_count': 9}])
+
+    def test_invalid_parameters(self):
+        for url, params in ((reverse("reports:top_products"), {'by': 'price'}),
+                            (reverse("reports:top_products"), {'limit': 'all'}),
+                            (reverse("reports:sales"), {'interval': 'week'}),
+                            (reverse("reports:sales"), {'created_before': 'yesterday'})):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
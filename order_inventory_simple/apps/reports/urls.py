@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .views import SalesAPIView, TopProductsAPIView
+
+
+app_name = 'reports'
+urlpatterns = [path('reports/top-products', TopProductsAPIView.as_view(), name="top_products"),
+               path('reports/sales', SalesAPIView.as_view(), name="sales"),
+               ]
@@ -0,0 +1,82 @@
+from django.db.models import Sum
+from django.db.models.functions import TruncDay, TruncHour
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..core.export import filter_created_at
+from ..core import metrics
+from ..core.metrics import MetricsViewMixin
+from .models import ProductSalesRollup
+from .renderers import ProductSalesJSONRenderer, SalesJSONRenderer
+from .serializers import SalesPeriodSerializer, TopProductSerializer
+
+RANKINGS = {'units': 'units_sold', 'revenue': 'revenue', 'orders': 'order_count'}
+INTERVALS = {'hour': TruncHour, 'day': TruncDay}
+DEFAULT_LIMIT = 10
+MAXIMUM_LIMIT = 100
+
+
+def _sums():
+    return {'units_sold': Sum('units_sold'), 'revenue': Sum('revenue'), 'order_count': Sum('order_count')}
+
+
+def _rollups(request):
+    """Rollup rows of the hours in [created_after, created_before)."""
+    try:
+        return filter_created_at(ProductSalesRollup.objects.all(),
+                                 request.query_params.get('created_after', None),
+                                 request.query_params.get('created_before', None),
+                                 field='period_start')
+    except ValueError as e:
+        raise ValidationError(str(e))
+
+
+class TopProductsAPIView(MetricsViewMixin, APIView):
+    """Best selling products, ranked `by` units, revenue or orders."""
+    renderer_classes = (ProductSalesJSONRenderer,)
+    serializer_class = TopProductSerializer
+
+    def get(self, request):
+        ranking = request.query_params.get('by', 'units')
+        if ranking not in RANKINGS:
+            raise ValidationError("by must be one of: {0}".format(', '.join(RANKINGS)))
+        try:
+            limit = min(int(request.query_params.get('limit', DEFAULT_LIMIT)), MAXIMUM_LIMIT)
+        except ValueError:
+            raise ValidationError("limit must be a number")
+
+        rows = (_rollups(request)
+                .values('product_id', 'product__name', 'product__slug')
+                .annotate(**_sums())
+                .order_by('-' + RANKINGS[ranking], 'product_id')[:max(limit, 0)])
+        serializer = self.serializer_class(rows, many=True)
+        return Response(metrics.serialized(serializer), status=status.HTTP_200_OK)
+
+
+class SalesAPIView(MetricsViewMixin, APIView):
+    """Units, revenue and orders per hour or day, of one `product` or all of them."""
+    renderer_classes = (SalesJSONRenderer,)
+    serializer_class = SalesPeriodSerializer
+
+    def get(self, request):
+        interval = request.query_params.get('interval', 'day')
+        if interval not in INTERVALS:
+            raise ValidationError("interval must be one of: {0}".format(', '.join(INTERVALS)))
+
+        rollups = _rollups(request)
+        product = request.query_params.get('product', None)
+        if product:
+            try:
+                rollups = rollups.filter(product_id=int(product))
+            except ValueError:
+                raise ValidationError("product must be an id")
+
+        rows = (rollups
+                .annotate(period=INTERVALS[interval]('period_start'))
+                .values('period')
+                .annotate(**_sums())
+                .order_by('period'))
+        serializer = self.serializer_class(rows, many=True)
+        return Response(metrics.serialized(serializer), status=status.HTTP_200_OK)
@@ -0,0 +1,17 @@
+"""
+ASGI config for orderService project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+The views run in a bounded thread pool, see apps/core/asgi.py.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
+"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'order_inventory_simple.settings')
+
+from .apps.core.asgi import get_asgi_application
+
+application = get_asgi_application()
@@ -42,10 +42,12 @@ INSTALLED_APPS = [
 
     'order_inventory_simple.apps.orders',
     'order_inventory_simple.apps.inventories',
+    'order_inventory_simple.apps.reports',
 
 ]
 
 MIDDLEWARE = [
+    'order_inventory_simple.apps.core.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +57,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# per-request query count and timings, as Server-Timing headers and on /api/_metrics
+REQUEST_METRICS_ENABLED = False
+
 ROOT_URLCONF = 'order_inventory_simple.urls'
 
 TEMPLATES = [
@@ -75,6 +80,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'order_inventory_simple.wsgi.application'
 
+# threads running views under ASGI, each holds a database connection, see apps/core/asgi.py
+ASGI_THREAD_POOL_SIZE = 32
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
@@ -87,6 +95,33 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
+    }
+}
+
+# inventory lookups by id and slug, see apps/inventories/cache.py
+INVENTORY_CACHE_ALIAS = 'default'
+INVENTORY_CACHE_TIMEOUT = 300
+# always read from the database, other fields may be served stale from the cache
+INVENTORY_CACHE_FRESH_FIELDS = ('quantity',)
+
+# Idempotency-Key of POST /api/orders, see apps/orders/idempotency.py
+IDEMPOTENCY_KEY_TTL = 86400
+IDEMPOTENCY_CACHE_ALIAS = 'default'
+
+# seconds stock is held by POST /api/reservations, see Reservation in apps/orders/models.py
+RESERVATION_TTL = 900
+RESERVATION_MAX_TTL = 3600
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
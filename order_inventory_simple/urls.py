@@ -16,8 +16,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from .apps.core.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics', metrics_view, name='metrics'),
     path('api/', include('order_inventory_simple.apps.inventories.urls', namespace='inventories')),
     path('api/', include('order_inventory_simple.apps.orders.urls', namespace='orders')),
+    path('api/', include('order_inventory_simple.apps.reports.urls', namespace='reports')),
 ]